@@ -41,11 +41,42 @@ if not BOT_TOKEN:
 # Настройки пайплайна для бота
 # =============================================================================
 
+# Максимум одновременно выполняемых пайплайнов (остальные ждут в очереди)
+MAX_CONCURRENT_PIPELINES: int = 2
+
+# Общая aiohttp-сессия бота (скачивание документов): размер пула соединений,
+# кэш DNS и время удержания keep-alive соединений (сек)
+HTTP_POOL_LIMIT: int = 64
+HTTP_DNS_CACHE_TTL_SECONDS: int = 300
+HTTP_KEEPALIVE_TIMEOUT_SECONDS: float = 60.0
+
+# Таймаут long polling запроса getUpdates (сек)
+POLLING_TIMEOUT_SECONDS: int = 30
+
 # Максимальное количество retry для VLM шага при сетевых ошибках
 VLM_MAX_RETRIES: int = 2
 
-# Таймаут ожидания между retry (секунды)
-VLM_RETRY_DELAY: float = 5.0
+# Exponential backoff между retry: base * 2**attempt, но не больше max (секунды)
+VLM_RETRY_BASE_DELAY_SECONDS: float = 5.0
+VLM_RETRY_MAX_DELAY_SECONDS: float = 60.0
+
+# Случайная добавка к задержке (min..max сек, 10–50 мс), чтобы retry разных пользователей не совпадали
+VLM_RETRY_JITTER_MIN_SECONDS: float = 0.01
+VLM_RETRY_JITTER_MAX_SECONDS: float = 0.05
+
+# Размер чанка при загрузке Excel отчёта в Telegram (FSInputFile читает файл
+# через aiofiles по чанкам: чтение следующего идёт, пока предыдущий уходит в сеть)
+EXCEL_UPLOAD_CHUNK_SIZE: int = 64 * 1024
+
+# Кэш результатов по ID файла Google Drive: повторная ссылка на тот же документ
+# получает готовый отчёт без перезапуска пайплайна. TTL ограничивает устаревание
+# (документ на Drive могут обновить по той же ссылке).
+RESULT_CACHE_DIR: Path = PROJECT_ROOT / "result" / "cache"
+RESULT_CACHE_TTL_SECONDS: float = 24 * 60 * 60
+RESULT_CACHE_MAX_ENTRIES: int = 100
+
+# Окно объединения статусных обновлений (сек): частые шаги уходят в Telegram одним edit
+STATUS_DEBOUNCE_SECONDS: float = 0.5
 
 
 # =============================================================================
@@ -82,6 +113,7 @@ class Messages:
     )
 
     LINK_ACCEPTED = "*Принял ссылку* — начинаю загрузку документа..."
+    PIPELINE_QUEUED = "*Сервер занят* — ваш документ в очереди, обработка начнётся автоматически."
 
     FALLBACK = (
         "*Бот в разработке*\n\n"
@@ -164,6 +196,15 @@ class Messages:
         "Сессия: `{session}`"
     )
 
+    PIPELINE_CACHED = (
+        "*АНАЛИЗ ЗАВЕРШЁН* (результат из кэша)\n\n"
+        "Документ: `{filename}`\n"
+        "Страниц OCR: {ocr_pages}\n"
+        "Релевантных: {relevant_pages}\n"
+        "Дефектов: {defects} (уникальных: {unique})\n"
+        "Сессия: `{session}`"
+    )
+
     ERROR_PIPELINE = "*Ошибка пайплайна:* {error}"
     ERROR_UNEXPECTED = (
         "*Произошла непредвиденная ошибка*\n\n"
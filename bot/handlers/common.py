@@ -9,7 +9,7 @@ from aiogram import types
 from aiogram.enums import ParseMode
 
 from bot.config import Messages
-from bot.keyboards.main import get_main_keyboard
+from bot.keyboards.main import MAIN_KEYBOARD
 
 
 async def fallback(message: types.Message) -> None:
@@ -22,6 +22,6 @@ async def fallback(message: types.Message) -> None:
     """
     await message.answer(
         Messages.FALLBACK,
-        reply_markup=get_main_keyboard(),
+        reply_markup=MAIN_KEYBOARD,
         parse_mode=ParseMode.MARKDOWN,
     )
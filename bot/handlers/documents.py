@@ -7,20 +7,38 @@
 from __future__ import annotations
 
 import asyncio
+import random
 from pathlib import Path
 
+import aiohttp
+import httpx
 from aiogram import types
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
 
 from config import logger
-from bot.config import Messages, VLM_MAX_RETRIES, VLM_RETRY_DELAY
-from bot.keyboards.main import get_main_keyboard
+from bot.config import (
+    EXCEL_UPLOAD_CHUNK_SIZE,
+    MAX_CONCURRENT_PIPELINES,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_TTL_SECONDS,
+    Messages,
+    STATUS_DEBOUNCE_SECONDS,
+    VLM_MAX_RETRIES,
+    VLM_RETRY_BASE_DELAY_SECONDS,
+    VLM_RETRY_MAX_DELAY_SECONDS,
+    VLM_RETRY_JITTER_MIN_SECONDS,
+    VLM_RETRY_JITTER_MAX_SECONDS,
+)
+from bot.keyboards.main import MAIN_KEYBOARD
 from services.pipeline import (
     DefectAnalysisPipeline,
     PipelineError,
     extract_google_drive_file_id,
     format_size,
 )
+from utils.result_cache import load_cached_result, store_result
 
 
 # =============================================================================
@@ -38,10 +56,46 @@ PII_TYPE_NAMES: dict[str, str] = {
     "bank_card": "карта",
 }
 
+# Сетевые ошибки, при которых VLM шаг имеет смысл повторить
+# (httpx — клиент VLM сервиса, TimeoutError покрывает и asyncio.TimeoutError)
+VLM_RETRYABLE_ERRORS: tuple[type[BaseException], ...] = (
+    httpx.TransportError,
+    TimeoutError,
+    ConnectionError,
+)
+
+# Ограничение одновременно работающих пайплайнов (общая память процесса бота)
+_PIPELINE_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_PIPELINES)
+
 # Максимум страниц для детального отображения в боте
 MAX_PII_PAGES_TO_SHOW = 1000
 
 
+def _format_pii_counts(type_counts: dict[str, int]) -> str:
+    """Форматирует счётчики PII по типам в порядке PII_TYPE_NAMES.
+
+    Обход идёт по каноническому порядку маппинга вместо сортировки ключей;
+    неизвестные маппингу типы (если появятся) выводятся в конце как есть.
+
+    Args:
+        type_counts: Словарь {тип_pii: количество}
+
+    Returns:
+        Строка вида "ФИО: 2, тел: 1"
+    """
+    parts = [
+        f"{name}: {count}"
+        for pii_type, name in PII_TYPE_NAMES.items()
+        if (count := type_counts.get(pii_type))
+    ]
+    parts.extend(
+        f"{pii_type}: {count}"
+        for pii_type, count in type_counts.items()
+        if pii_type not in PII_TYPE_NAMES and count
+    )
+    return ", ".join(parts)
+
+
 def _format_pii_page_details(
     pii_by_page: dict[int, dict[str, int]],
 ) -> str:
@@ -64,12 +118,7 @@ def _format_pii_page_details(
     remaining = len(pages_sorted) - len(pages_to_show)
 
     for page_num in pages_to_show:
-        type_counts = pii_by_page[page_num]
-        # Форматируем типы для этой страницы
-        types_str = ", ".join(
-            f"{PII_TYPE_NAMES.get(t, t)}: {c}"
-            for t, c in sorted(type_counts.items())
-        )
+        types_str = _format_pii_counts(pii_by_page[page_num])
         lines.append(f"  стр. {page_num}: {types_str}")
 
     if remaining > 0:
@@ -78,30 +127,162 @@ def _format_pii_page_details(
     return "\n".join(lines)
 
 
-def is_google_drive_link(message: types.Message) -> bool:
-    """Проверяет, содержит ли сообщение ссылку Google Drive.
+def _vlm_retry_delay(attempt: int) -> float:
+    """Задержка перед повтором VLM шага: exponential backoff + jitter.
 
     Args:
-        message: Входящее сообщение
+        attempt: Номер неудачной попытки (0-based)
 
     Returns:
-        True если сообщение содержит валидную ссылку GDrive
+        Время ожидания в секундах
+    """
+    backoff = min(VLM_RETRY_MAX_DELAY_SECONDS, VLM_RETRY_BASE_DELAY_SECONDS * (2**attempt))
+    return backoff + random.uniform(VLM_RETRY_JITTER_MIN_SECONDS, VLM_RETRY_JITTER_MAX_SECONDS)
+
+
+def _parse_mode(markdown: bool) -> ParseMode | None:
+    """Режим разметки: простой текст отправляется без parse_mode.
+
+    None явно отключает и parse_mode по умолчанию из DefaultBotProperties.
     """
-    text = (message.text or "").strip()
-    return bool(extract_google_drive_file_id(text))
+    return ParseMode.MARKDOWN if markdown else None
 
 
-async def _send_status(message: types.Message, text: str) -> types.Message:
-    """Отправляет статусное сообщение с Markdown разметкой.
+async def _send_status(
+    message: types.Message,
+    text: str,
+    markdown: bool = True,
+) -> types.Message:
+    """Отправляет статусное сообщение.
 
     Args:
         message: Исходное сообщение пользователя
         text: Текст для отправки
+        markdown: Содержит ли текст Markdown разметку (False — простой текст)
 
     Returns:
         Отправленное сообщение
     """
-    return await message.answer(text, parse_mode=ParseMode.MARKDOWN)
+    return await message.answer(text, parse_mode=_parse_mode(markdown))
+
+
+def _send_status_bg(message: types.Message, text: str) -> asyncio.Task[types.Message]:
+    """Отправляет статусное сообщение в фоне, не задерживая следующий шаг.
+
+    Задачу нужно дождаться через `_await_status_tasks`, чтобы ошибки
+    отправки не потерялись.
+
+    Args:
+        message: Исходное сообщение пользователя
+        text: Текст для отправки
+
+    Returns:
+        Задача отправки сообщения
+    """
+    return asyncio.create_task(_send_status(message, text))
+
+
+async def _await_status_tasks(tasks: list[asyncio.Task[types.Message]]) -> None:
+    """Дожидается фоновых отправок статуса и логирует их ошибки.
+
+    Args:
+        tasks: Задачи, созданные через `_send_status_bg`
+    """
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.warning("Не удалось отправить статусное сообщение: %s", result)
+
+
+async def _edit_status(
+    status_msg: types.Message,
+    text: str,
+    markdown: bool = True,
+) -> None:
+    """Обновляет статусное сообщение пайплайна вместо отправки нового.
+
+    Args:
+        status_msg: Ранее отправленное статусное сообщение
+        text: Новый текст
+        markdown: Содержит ли текст Markdown разметку (False — простой текст)
+    """
+    try:
+        await status_msg.edit_text(text, parse_mode=_parse_mode(markdown))
+    except TelegramBadRequest as e:
+        # Telegram отклоняет edit с тем же текстом — это не ошибка
+        if "message is not modified" not in str(e):
+            raise
+
+
+class StatusBatcher:
+    """Объединяет частые обновления статуса пайплайна в один edit_text.
+
+    Первое обновление открывает окно `delay` секунд; обновления внутри окна
+    только заменяют текст, по истечении окна в Telegram уходит последний.
+    Быстрые шаги (старт/финиш за доли секунды) не тратят лишние запросы.
+    """
+
+    def __init__(self, status_msg: types.Message, delay: float = STATUS_DEBOUNCE_SECONDS) -> None:
+        """
+        Args:
+            status_msg: Статусное сообщение, которое обновляется через edit
+            delay: Окно объединения обновлений (сек)
+        """
+        self._status_msg = status_msg
+        self._delay = delay
+        self._latest_text: str | None = None
+        self._latest_markdown = True
+        self._sent_text: str | None = None
+        self._flush_task: asyncio.Task[None] | None = None
+        self._lock = asyncio.Lock()
+
+    async def update(self, text: str, markdown: bool = True) -> None:
+        """Запоминает новый статус и планирует отправку по окончании окна.
+
+        Не ждёт сетевого запроса (и блокировки идущего edit): следующий шаг
+        пайплайна стартует сразу, статус уходит в Telegram параллельно с ним.
+
+        Args:
+            text: Новый статус
+            markdown: Содержит ли текст Markdown разметку
+        """
+        self._latest_text = text
+        self._latest_markdown = markdown
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def flush(self, text: str | None = None, markdown: bool = True) -> None:
+        """Немедленно отправляет последний статус (без ожидания окна).
+
+        Args:
+            text: Новый статус (если None — отправляется последний сохранённый)
+            markdown: Содержит ли новый текст Markdown разметку
+        """
+        async with self._lock:
+            if text is not None:
+                self._latest_text = text
+                self._latest_markdown = markdown
+
+            task, self._flush_task = self._flush_task, None
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+
+            if self._latest_text is None or self._latest_text == self._sent_text:
+                return
+            self._sent_text = self._latest_text
+            await _edit_status(self._status_msg, self._latest_text, self._latest_markdown)
+
+    async def close(self) -> None:
+        """Отправляет отложенный статус в конце пайплайна, не пробрасывая ошибки."""
+        try:
+            await self.flush()
+        except Exception:
+            # Статус — вспомогательная информация, пайплайн из-за него не падает
+            logger.warning("Не удалось обновить статусное сообщение", exc_info=True)
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self._delay)
+        await self.close()
 
 
 # =============================================================================
@@ -120,35 +301,113 @@ async def handle_upload_button(message: types.Message) -> None:
     await _send_status(message, Messages.UPLOAD_INSTRUCTION)
 
 
-async def handle_google_drive_link(message: types.Message) -> None:
+async def handle_google_drive_link(
+    message: types.Message,
+    http_session: aiohttp.ClientSession | None = None,
+) -> None:
     """Обрабатывает ссылку Google Drive и запускает пайплайн анализа.
 
-    Оркестрирует последовательный запуск всех 7 шагов пайплайна,
-    отправляя пользователю статусные сообщения после каждого шага.
+    Число одновременно работающих пайплайнов ограничено семафором:
+    каждый держит в памяти PDF, OCR и промежуточные результаты.
+    Остальные запросы ждут своей очереди.
 
     Args:
         message: Входящее сообщение со ссылкой
+        http_session: Общая aiohttp-сессия бота (из workflow data диспетчера)
     """
     link = (message.text or "").strip()
 
     # Валидация ссылки
-    if not extract_google_drive_file_id(link):
+    file_id = extract_google_drive_file_id(link)
+    if not file_id:
         await _send_status(message, Messages.INVALID_LINK)
         return
 
+    # Тот же документ уже обрабатывался недавно — отдаём готовый отчёт
+    if await _send_cached_result(message, file_id):
+        return
+
+    # Уведомление об очереди уходит в фоне: встаём в очередь семафора сразу
+    status_tasks: list[asyncio.Task[types.Message]] = []
+    if _PIPELINE_SEMAPHORE.locked():
+        status_tasks.append(_send_status_bg(message, Messages.PIPELINE_QUEUED))
+
+    try:
+        async with _PIPELINE_SEMAPHORE:
+            await _run_pipeline(message, link, file_id, http_session)
+    finally:
+        await _await_status_tasks(status_tasks)
+
+
+async def _send_cached_result(message: types.Message, file_id: str) -> bool:
+    """Отправляет Excel отчёт из кэша результатов, если он есть.
+
+    Args:
+        message: Входящее сообщение со ссылкой
+        file_id: ID файла Google Drive (ключ кэша)
+
+    Returns:
+        True если отчёт найден в кэше и отправлен
+    """
+    cached = await asyncio.to_thread(
+        load_cached_result, RESULT_CACHE_DIR, file_id, RESULT_CACHE_TTL_SECONDS
+    )
+    if cached is None:
+        return False
+
+    try:
+        caption = Messages.PIPELINE_CACHED.format(**cached.meta)
+    except KeyError:
+        # Запись старого формата — считаем промахом
+        return False
+
+    document = types.FSInputFile(
+        cached.excel_path,
+        filename=cached.excel_path.name,
+        chunk_size=EXCEL_UPLOAD_CHUNK_SIZE,
+    )
+    await message.answer_document(
+        document,
+        caption=caption,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=MAIN_KEYBOARD,
+    )
+    logger.info("Отчёт для файла %s отправлен из кэша", file_id)
+    return True
+
+
+async def _run_pipeline(
+    message: types.Message,
+    link: str,
+    file_id: str,
+    http_session: aiohttp.ClientSession | None = None,
+) -> None:
+    """Оркестрирует последовательный запуск всех 7 шагов пайплайна.
+
+    Отправляет пользователю статусные сообщения после каждого шага.
+
+    Args:
+        message: Входящее сообщение со ссылкой
+        link: Проверенная ссылка Google Drive
+        file_id: ID файла Google Drive (ключ кэша результатов)
+        http_session: Общая aiohttp-сессия бота
+    """
     # Создаём пайплайн
-    pipeline = DefectAnalysisPipeline(link)
+    pipeline = DefectAnalysisPipeline(link, http_session=http_session)
 
-    await _send_status(message, Messages.LINK_ACCEPTED)
+    # Одно статусное сообщение на весь пайплайн: шаги обновляют его через edit,
+    # новые сообщения отправляются только для результата и ошибок
+    # (лимит Telegram ~30 сообщений/сек на бота делится между всеми пользователями).
+    status_msg = await _send_status(message, Messages.LINK_ACCEPTED)
+    status = StatusBatcher(status_msg)
 
     try:
         # === ШАГ 0: Скачивание документа ===
-        await _send_status(message, Messages.STEP_DOWNLOAD_START)
+        await status.update(Messages.STEP_DOWNLOAD_START)
 
         download_meta = await pipeline.download_document()
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_DOWNLOAD_DONE.format(
                 filename=download_meta.filename,
                 size=format_size(download_meta.size_bytes),
@@ -157,12 +416,11 @@ async def handle_google_drive_link(message: types.Message) -> None:
         )
 
         # === ШАГ 1: OCR ===
-        await _send_status(message, Messages.STEP_OCR_START)
+        await status.update(Messages.STEP_OCR_START)
 
         ocr_meta = await pipeline.run_ocr()
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_OCR_DONE.format(
                 pages=ocr_meta.total_pages,
                 duration=ocr_meta.duration,
@@ -170,20 +428,16 @@ async def handle_google_drive_link(message: types.Message) -> None:
         )
 
         # === ШАГ 1.5: Маскирование персональных данных ===
-        await _send_status(message, Messages.STEP_PII_START)
+        await status.update(Messages.STEP_PII_START)
 
         pii_meta = await pipeline.run_pii_masking()
 
         if pii_meta.has_pii:
             # Форматируем общую статистику по типам
-            pii_types_str = ", ".join(
-                f"{PII_TYPE_NAMES.get(k, k)}: {v}"
-                for k, v in sorted(pii_meta.pii_by_type.items())
-            )
+            pii_types_str = _format_pii_counts(pii_meta.pii_by_type)
             # Форматируем детализацию по страницам
             details_str = _format_pii_page_details(pii_meta.pii_by_page)
-            await _send_status(
-                message,
+            await status.update(
                 Messages.STEP_PII_DONE_MASKED.format(
                     count=pii_meta.total_pii_count,
                     types=pii_types_str,
@@ -191,10 +445,10 @@ async def handle_google_drive_link(message: types.Message) -> None:
                 ),
             )
         else:
-            await _send_status(message, Messages.STEP_PII_DONE_CLEAN)
+            await status.update(Messages.STEP_PII_DONE_CLEAN)
 
         # === ШАГ 2: Фильтрация релевантных страниц ===
-        await _send_status(message, Messages.STEP_FILTER_START)
+        await status.update(Messages.STEP_FILTER_START)
 
         filter_meta = await pipeline.run_page_filter()
 
@@ -202,8 +456,7 @@ async def handle_google_drive_link(message: types.Message) -> None:
             await _send_status(message, Messages.STEP_FILTER_NO_PAGES)
             return
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_FILTER_DONE.format(
                 relevant=len(filter_meta.relevant_pages),
                 total=filter_meta.total_pages,
@@ -214,38 +467,38 @@ async def handle_google_drive_link(message: types.Message) -> None:
         )
 
         # === ШАГ 3: VLM очистка (с retry логикой) ===
-        await _send_status(message, Messages.STEP_VLM_START)
+        await status.update(Messages.STEP_VLM_START)
 
         vlm_meta = None
         for attempt in range(VLM_MAX_RETRIES):
             try:
                 vlm_meta = await pipeline.run_vlm_cleaning()
                 break
-            except Exception as e:
-                is_network_error = "Connection" in str(e) or "Timeout" in str(e)
-                is_last_attempt = attempt >= VLM_MAX_RETRIES - 1
-
-                if is_network_error and not is_last_attempt:
-                    await _send_status(
-                        message,
-                        Messages.STEP_VLM_RETRY.format(
-                            attempt=attempt + 1,
-                            max_attempts=VLM_MAX_RETRIES,
-                        ),
-                    )
-                    await asyncio.sleep(VLM_RETRY_DELAY)
-                    continue
-                else:
+            except VLM_RETRYABLE_ERRORS:
+                if attempt >= VLM_MAX_RETRIES - 1:
                     logger.exception("VLM шаг провалился после %d попыток", attempt + 1)
                     await _send_status(message, Messages.ERROR_VLM_FAILED)
                     return
 
+                await status.update(
+                    Messages.STEP_VLM_RETRY.format(
+                        attempt=attempt + 1,
+                        max_attempts=VLM_MAX_RETRIES,
+                    ),
+                    markdown=False,
+                )
+                await asyncio.sleep(_vlm_retry_delay(attempt))
+            except Exception:
+                # Не сетевая ошибка — повтор не поможет
+                logger.exception("VLM шаг провалился (без повтора)")
+                await _send_status(message, Messages.ERROR_VLM_FAILED)
+                return
+
         if vlm_meta is None:
             await _send_status(message, Messages.ERROR_VLM_FAILED)
             return
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_VLM_DONE.format(
                 pages=vlm_meta.processed_pages,
                 duration=vlm_meta.duration,
@@ -253,12 +506,11 @@ async def handle_google_drive_link(message: types.Message) -> None:
         )
 
         # === ШАГ 4: Извлечение дефектов ===
-        await _send_status(message, Messages.STEP_EXTRACT_START)
+        await status.update(Messages.STEP_EXTRACT_START)
 
         extract_meta = await pipeline.run_defect_extraction()
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_EXTRACT_DONE.format(
                 defects=extract_meta.total_defects,
                 duration=extract_meta.duration,
@@ -266,12 +518,11 @@ async def handle_google_drive_link(message: types.Message) -> None:
         )
 
         # === ШАГ 5: Дедупликация ===
-        await _send_status(message, Messages.STEP_DEDUP_START)
+        await status.update(Messages.STEP_DEDUP_START)
 
         dedup_meta = await pipeline.run_deduplication()
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_DEDUP_DONE.format(
                 total=dedup_meta.total_defects,
                 unique=dedup_meta.unique_defects,
@@ -281,44 +532,47 @@ async def handle_google_drive_link(message: types.Message) -> None:
         )
 
         # === ШАГ 6: Генерация Excel ===
-        await _send_status(message, Messages.STEP_EXCEL_START)
+        await status.update(Messages.STEP_EXCEL_START)
 
         excel_meta = await pipeline.run_excel_generation()
 
-        await _send_status(
-            message,
+        await status.update(
             Messages.STEP_EXCEL_DONE.format(duration=excel_meta.duration),
         )
 
         # === ШАГ 7: Отправка результата ===
-        await _send_status(message, Messages.STEP_SEND_START)
-
         total_duration = pipeline.total_duration()
 
-        # Формируем caption для Excel файла
-        caption = Messages.PIPELINE_DONE.format(
-            filename=download_meta.filename,
-            ocr_pages=ocr_meta.total_pages,
-            relevant_pages=len(filter_meta.relevant_pages),
-            defects=dedup_meta.total_defects,
-            unique=dedup_meta.unique_defects,
-            duration=total_duration,
-            session=pipeline.pipeline_dir.name,
-        )
-
-        # Отправляем Excel файл
+        # Формируем caption для Excel файла (эти же данные сохраняются в кэш)
+        caption_meta = {
+            "filename": download_meta.filename,
+            "ocr_pages": ocr_meta.total_pages,
+            "relevant_pages": len(filter_meta.relevant_pages),
+            "defects": dedup_meta.total_defects,
+            "unique": dedup_meta.unique_defects,
+            "session": pipeline.pipeline_dir.name,
+        }
+        caption = Messages.PIPELINE_DONE.format(duration=total_duration, **caption_meta)
+
+        # Отправляем Excel файл: FSInputFile.read() — async-генератор поверх aiofiles,
+        # aiohttp-сессия aiogram отдаёт его в multipart тело по мере чтения,
+        # поэтому файл не буферизуется целиком и event loop не блокируется
         excel_path = Path(excel_meta.excel_path)
-        with open(excel_path, "rb") as excel_file:
-            document = types.BufferedInputFile(
-                excel_file.read(),
-                filename=excel_path.name,
-            )
-            await message.answer_document(
+        document = types.FSInputFile(
+            excel_path,
+            filename=excel_path.name,
+            chunk_size=EXCEL_UPLOAD_CHUNK_SIZE,
+        )
+        # Финальный статус (без окна объединения) и загрузка файла идут параллельно
+        await asyncio.gather(
+            status.flush(Messages.STEP_SEND_START),
+            message.answer_document(
                 document,
                 caption=caption,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=get_main_keyboard(),
-            )
+                reply_markup=MAIN_KEYBOARD,
+            ),
+        )
 
         logger.info(
             "Пайплайн завершён для пользователя %s: %d дефектов, %.1f сек",
@@ -327,6 +581,19 @@ async def handle_google_drive_link(message: types.Message) -> None:
             total_duration,
         )
 
+        try:
+            await asyncio.to_thread(
+                store_result,
+                RESULT_CACHE_DIR,
+                file_id,
+                excel_path,
+                caption_meta,
+                RESULT_CACHE_MAX_ENTRIES,
+            )
+        except OSError:
+            # Отчёт уже отправлен — ошибка кэша не должна доходить до пользователя
+            logger.warning("Не удалось сохранить результат в кэш", exc_info=True)
+
     except PipelineError as error:
         logger.warning("Ошибка пайплайна: %s", error)
         await _send_status(
@@ -337,3 +604,7 @@ async def handle_google_drive_link(message: types.Message) -> None:
     except Exception as error:
         logger.exception("Неожиданная ошибка пайплайна")
         await _send_status(message, Messages.ERROR_UNEXPECTED)
+
+    finally:
+        # Не оставляем висящую задачу отложенного обновления статуса
+        await status.close()
@@ -1,10 +1,15 @@
 """Клавиатуры Telegram бота.
 
 Содержит Reply и Inline клавиатуры для взаимодействия с пользователем.
+
+Клавиатуры статичны, а модели aiogram неизменяемы (frozen), поэтому
+каждая создаётся один раз и переиспользуется во всех ответах.
 """
 
 from __future__ import annotations
 
+from functools import lru_cache
+
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
@@ -18,6 +23,7 @@ from aiogram.types import (
 # =============================================================================
 
 
+@lru_cache(maxsize=1)
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Основная клавиатура с кнопкой загрузки документа.
 
@@ -34,6 +40,7 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=1)
 def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура с кнопкой отмены (для будущего использования).
 
@@ -49,11 +56,16 @@ def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
+# Основная клавиатура нужна почти в каждом ответе — готовый экземпляр на уровне модуля
+MAIN_KEYBOARD: ReplyKeyboardMarkup = get_main_keyboard()
+
+
 # =============================================================================
 # Inline Keyboards (кнопки под сообщениями)
 # =============================================================================
 
 
+@lru_cache(maxsize=1)
 def get_retry_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой повторной попытки.
 
@@ -67,6 +79,7 @@ def get_retry_keyboard() -> InlineKeyboardMarkup:
     )
 
 
+@lru_cache(maxsize=1)
 def get_help_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопками помощи.
 
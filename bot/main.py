@@ -19,21 +19,29 @@ PROJECT_ROOT = Path(__file__).parent.parent.resolve()
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+import aiohttp
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import CommandStart
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from config import logger
-from bot.config import BOT_TOKEN
+from bot.config import (
+    BOT_TOKEN,
+    HTTP_DNS_CACHE_TTL_SECONDS,
+    HTTP_KEEPALIVE_TIMEOUT_SECONDS,
+    HTTP_POOL_LIMIT,
+    POLLING_TIMEOUT_SECONDS,
+)
 from bot.keyboards.main import ButtonText
 from bot.handlers.start import cmd_start
 from bot.handlers.documents import (
     handle_upload_button,
     handle_google_drive_link,
-    is_google_drive_link,
 )
 from bot.handlers.common import fallback
+from services.defect_extractor import close_flowise_client
+from services.pipeline import GDRIVE_LINK_RE
 
 
 def create_bot() -> Bot:
@@ -48,6 +56,21 @@ def create_bot() -> Bot:
     )
 
 
+def create_http_session() -> aiohttp.ClientSession:
+    """Создаёт общую aiohttp-сессию с пулом соединений для скачивания PDF.
+
+    Returns:
+        Сессия; хендлеры получают её аргументом `http_session`
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL_SECONDS,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT_SECONDS,
+        ),
+    )
+
+
 def create_dispatcher() -> Dispatcher:
     """Создаёт и настраивает диспетчер с роутерами.
 
@@ -70,8 +93,7 @@ def create_dispatcher() -> Dispatcher:
     # 3. Ссылки Google Drive
     dp.message.register(
         handle_google_drive_link,
-        F.text,
-        F.func(is_google_drive_link),
+        F.text.regexp(GDRIVE_LINK_RE),
     )
 
     # 4. Fallback (должен быть последним!)
@@ -101,6 +123,7 @@ async def on_shutdown(bot: Bot) -> None:
         bot: Экземпляр бота
     """
     logger.info("Бот останавливается...")
+    await close_flowise_client()
     await bot.session.close()
 
 
@@ -112,13 +135,16 @@ async def main() -> None:
 
     bot = create_bot()
     dp = create_dispatcher()
+    # Общая сессия живёт всё время работы бота: создаётся и закрывается здесь,
+    # в хендлеры передаётся через kwargs start_polling
+    http_session = create_http_session()
 
     # Регистрируем lifecycle хуки
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
 
     # Graceful shutdown по сигналам
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
 
     def signal_handler() -> None:
         logger.info("Получен сигнал завершения...")
@@ -136,14 +162,21 @@ async def main() -> None:
         await dp.start_polling(
             bot,
             allowed_updates=["message", "callback_query"],
+            polling_timeout=POLLING_TIMEOUT_SECONDS,
+            # Апдейты обрабатываются задачами; тяжёлые пайплайны ограничены
+            # семафором в хендлере, чтобы всплеск ссылок не исчерпал память
+            handle_as_tasks=True,
+            http_session=http_session,
         )
     finally:
+        await http_session.close()
         await on_shutdown(bot)
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        with asyncio.Runner() as runner:
+            runner.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем (Ctrl+C)")
     except Exception as e:
@@ -26,18 +26,29 @@ logger = logging.getLogger("FSK_pred_prod")
 # DPI рендера PDF в изображения. Чем выше — тем лучше OCR, но тем больше время/память.
 PDF_RENDER_DPI = 300
 
-# Формат рендера страниц на диск. Для скорости обычно достаточно jpeg.
-PDF_RENDER_FORMAT = "jpeg"  # "jpeg" | "png"
-
 # Кол-во потоков рендера (pdf2image). Не делайте слишком большим.
 PDF_RENDER_THREAD_COUNT = 2
 
+# Рендер в память (без файлов, когда OCR идёт через tesserocr): сколько страниц
+# рендерить за один вызов pdf2image. Ограничивает пик памяти на рендер.
+PDF_RENDER_BATCH_PAGES = 8
+
 # -----------------------------
 # Предобработка изображений (перед OCR)
 # -----------------------------
 # Включить нормализацию контраста (cv2.normalize)
 PDF_PREPROCESS_NORMALIZE = True
 
+# Не нормализовать страницу, если её яркость уже покрывает почти весь диапазон:
+# max - min (по прореженной выборке пикселей) >= этого значения
+PDF_PREPROCESS_NORMALIZE_SKIP_RANGE = 230
+
+# Пустые страницы (разделители, обложки без текста) не отправляются в OCR:
+# страница пустая, если std яркости (по прореженной выборке, до нормализации) < порога.
+# (чистый лист: ~0 у цифрового PDF, ~2 у скана; одна строка текста — уже ~6).
+# 0 — не определять пустые страницы
+PDF_BLANK_PAGE_STD_THRESHOLD = 3.0
+
 # Формат сохранения предобработанных страниц
 PDF_PREPROCESS_OUTPUT_FORMAT = "png"  # удобнее для дальнейшего OCR
 
@@ -58,9 +69,15 @@ TESSERACT_PRESERVE_INTERWORD_SPACES = 1
 TESSERACT_PAGE_TIMEOUT_SECONDS = 300
 
 # Сколько страниц OCR обрабатывать параллельно (ограничение по одновременным tesseract-процессам).
-# 3–4 обычно даёт хороший баланс скорости/нагрузки.
+# 3–4 обычно даёт хороший баланс скорости/нагрузки. Ограничивается числом доступных CPU;
+# 0 — по числу доступных CPU.
 OCR_PAGE_CONCURRENCY = 4
 
+# CLI tesseract: сколько страниц распознавать одним процессом (list-файл).
+# Больше — меньше запусков процесса и загрузок моделей, но позже старт OCR
+# первых страниц. С tesserocr страницы идут по одной.
+OCR_TESSERACT_BATCH_PAGES = 4
+
 # Оставлять ли временную папку предпроцессинга (workdir) после OCR.
 # Для отладки можно включить True и смотреть изображения. В проде обычно False.
 OCR_KEEP_PREPROCESS_WORKDIR = False
@@ -81,6 +98,17 @@ FLOWISE_TIMEOUT_SECONDS = 300
 # Максимум символов текста страницы в промпте (обрезка для экономии токенов)
 FLOWISE_MAX_CHARS_PER_PAGE = 15000
 
+# Сколько батчей отправлять в Flowise одновременно (обе фазы FSM)
+FLOWISE_SEARCH_CONCURRENCY = 4
+
+# SEARCH_END: сколько батчей запрашивать заранее (ответы всё равно
+# обрабатываются по порядку; после найденного конца лишние запросы отменяются)
+FLOWISE_SEARCH_END_LOOKAHEAD = 3
+
+# Сохранять сырой ответ Flowise в отладке батчей (raw_response) — самая
+# тяжёлая часть JSON результата фильтрации, по умолчанию выключено
+FLOWISE_STORE_RAW_RESPONSE = False
+
 # -----------------------------
 # VLM Page Cleaner (Flowise Vision)
 # -----------------------------
@@ -125,3 +153,10 @@ DEFECT_EXTRACTION_TIMEOUT_SECONDS = 180
 # Retry настройки
 DEFECT_EXTRACTION_MAX_RETRIES = 3
 DEFECT_EXTRACTION_RETRY_DELAY_SECONDS = 2
+
+# -----------------------------
+# Defect Deduplicator
+# -----------------------------
+# Порог нечёткого сравнения локализаций (0..1, Jaro-Winkler через rapidfuzz).
+# None — только точное совпадение ключа (room, location, defect).
+DEDUP_FUZZY_THRESHOLD = None
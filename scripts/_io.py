@@ -0,0 +1,142 @@
+"""Загрузка JSON артефактов пайплайна в CLI-скриптах.
+
+Единый `load_model(path, Model)` вместо отдельного загрузчика в каждом скрипте:
+- чтение через aiofiles, парсинг orjson;
+- JSON созданы этим же пайплайном, поэтому по умолчанию модели собираются
+  без валидации (model_construct, вложенные списки — явно);
+  validate=True — полная pydantic-проверка;
+- VLM результат (полные тексты страниц) при наличии ijson разбирается потоково;
+- `load_json(path)` — сырой dict для сценариев без моделей.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypeVar
+
+import aiofiles
+import orjson
+from pydantic import BaseModel
+
+from services.defect_deduplicator import DeduplicatedDefect, DeduplicationResult
+from services.defect_extractor import DefectExtractionResult, ExtractedDefect
+from services.vlm_page_cleaner import CleanedPageData, VLMCleaningResult
+
+# ijson — потоковый разбор VLM JSON без промежуточного dict всего документа
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+# =============================================================================
+# Сборка моделей без валидации
+# =============================================================================
+
+
+def _construct_vlm_result(data: dict[str, Any]) -> VLMCleaningResult:
+    pages = [
+        p if isinstance(p, CleanedPageData) else CleanedPageData.model_construct(**p)
+        for p in data.get("cleaned_pages", [])
+    ]
+    return VLMCleaningResult.model_construct(**{**data, "cleaned_pages": pages})
+
+
+def _construct_extraction_result(data: dict[str, Any]) -> DefectExtractionResult:
+    defects = [ExtractedDefect.model_construct(**d) for d in data.get("defects", [])]
+    return DefectExtractionResult.model_construct(**{**data, "defects": defects})
+
+
+def _construct_dedup_result(data: dict[str, Any]) -> DeduplicationResult:
+    defects = [
+        DeduplicatedDefect(**{**d, "duplicates": tuple(d.get("duplicates", ()))})
+        for d in data.get("defects", [])
+    ]
+    return DeduplicationResult.model_construct(**{**data, "defects": defects})
+
+
+# model_construct неглубокий — для каждой модели вложенные списки собираются явно
+_CONSTRUCTORS: dict[type[BaseModel], Callable[[dict[str, Any]], BaseModel]] = {
+    VLMCleaningResult: _construct_vlm_result,
+    DefectExtractionResult: _construct_extraction_result,
+    DeduplicationResult: _construct_dedup_result,
+}
+
+
+def _build_model(data: dict[str, Any], cls: type[ModelT], validate: bool) -> ModelT:
+    constructor = _CONSTRUCTORS.get(cls)
+    if validate or constructor is None:
+        return cls.model_validate(data)
+    return constructor(data)
+
+
+# =============================================================================
+# Загрузка
+# =============================================================================
+
+
+def _load_vlm_result_streaming(json_path: Path, validate: bool) -> VLMCleaningResult:
+    """Загружает VLMCleaningResult за один проход ijson.
+
+    Страницы собираются в CleanedPageData по одной: сырой dict каждой страницы
+    живёт только до её сборки, поэтому текст страниц не хранится в памяти
+    дважды (dict всего документа + модель).
+    """
+    scalars: dict[str, object] = {}
+    pages: list[CleanedPageData] = []
+    builder = None
+
+    with json_path.open("rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if prefix == "cleaned_pages.item" or prefix.startswith("cleaned_pages.item."):
+                if event == "start_map" and prefix == "cleaned_pages.item":
+                    builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                if event == "end_map" and prefix == "cleaned_pages.item":
+                    page = builder.value
+                    pages.append(
+                        CleanedPageData.model_validate(page)
+                        if validate
+                        else CleanedPageData.model_construct(**page)
+                    )
+                    builder = None
+            elif prefix and "." not in prefix and event in ("string", "number", "boolean", "null"):
+                scalars[prefix] = value
+
+    return _build_model({**scalars, "cleaned_pages": pages}, VLMCleaningResult, validate)
+
+
+async def load_json(json_path: Path) -> dict[str, Any]:
+    """Читает JSON файл как dict (без сборки моделей).
+
+    Args:
+        json_path: Путь к JSON файлу
+
+    Returns:
+        Распарсенный JSON
+    """
+    async with aiofiles.open(json_path, "rb") as f:
+        raw = await f.read()
+    return orjson.loads(raw)
+
+
+async def load_model(json_path: Path, cls: type[ModelT], validate: bool = False) -> ModelT:
+    """Загружает pydantic-модель артефакта пайплайна из JSON файла.
+
+    Args:
+        json_path: Путь к JSON файлу
+        cls: Класс модели (VLMCleaningResult, DefectExtractionResult, ...)
+        validate: Полная pydantic-валидация (по умолчанию — сборка без проверки)
+
+    Returns:
+        Экземпляр модели
+    """
+    if cls is VLMCleaningResult and IJSON_AVAILABLE:
+        return await asyncio.to_thread(_load_vlm_result_streaming, json_path, validate)
+
+    return _build_model(await load_json(json_path), cls, validate)
@@ -0,0 +1,35 @@
+"""Запуск async точек входа CLI-скриптов.
+
+Если установлен uvloop — скрипты работают на нём (event loop на libuv
+быстрее стандартного для HTTP/файлового I/O), иначе на стандартном asyncio.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+T = TypeVar("T")
+
+
+def run_async(main: Coroutine[Any, Any, T]) -> T:
+    """Выполняет корутину в новом event loop (uvloop, если доступен).
+
+    Args:
+        main: Корутина точки входа скрипта
+
+    Returns:
+        Результат корутины
+    """
+    if not UVLOOP_AVAILABLE:
+        return asyncio.run(main)
+
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(main)
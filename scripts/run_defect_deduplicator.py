@@ -9,71 +9,111 @@
 
   # С кастомной папкой для результата
   python3 -m scripts.run_defect_deduplicator "defects.json" --out-dir "artifacts/dedup"
+
+  # С нечётким сравнением локализаций (нужен rapidfuzz)
+  python3 -m scripts.run_defect_deduplicator "defects.json" --fuzzy-threshold 0.85
 """
 
 from __future__ import annotations
 
 import argparse
 import asyncio
-import json
+import sys
+from operator import attrgetter, itemgetter
 from pathlib import Path
 
-from config import logger
+from config import DEDUP_FUZZY_THRESHOLD, logger
+from scripts._io import load_json, load_model
+from scripts._runtime import run_async
 from services.defect_extractor import DefectExtractionResult
-from services.defect_deduplicator import deduplicate_defects, save_dedup_result
-
-
-def _load_extraction_result(json_path: Path) -> DefectExtractionResult:
-    """Загружает DefectExtractionResult из JSON файла."""
-    with json_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    return DefectExtractionResult(**data)
+from services.defect_deduplicator import (
+    deduplicate_defects,
+    deduplicate_defects_fast,
+    save_dedup_result,
+)
+
+# Поля сводки: у модели читаются через attrgetter, у сырого dict — через itemgetter
+_SUMMARY_FIELDS = (
+    "source_pdf",
+    "total_defects",
+    "unique_defects",
+    "duplicate_groups",
+    "elapsed_seconds",
+)
+
+DUPLICATE_TEMPLATE = """
+--- Строка {row} (стр. {page}) ---
+Помещение: {room}
+Локализация: {location}
+Тип дефекта: {defect}
+Дубликаты строк: {duplicates}"""
 
 
 async def async_main(args: argparse.Namespace) -> int:
     """Async точка входа."""
-    json_path = Path(args.json).expanduser().resolve()
+    json_path = Path(args.json).expanduser().absolute()
     if not json_path.exists():
         raise SystemExit(f"JSON файл не найден: {json_path}")
 
-    out_dir = Path(args.out_dir).expanduser().resolve()
+    out_dir = Path(args.out_dir).expanduser().absolute()
 
     try:
-        # Загружаем результат извлечения дефектов
-        extraction_result = _load_extraction_result(json_path)
-        logger.info(
-            "Загружен результат: %s, %d дефектов",
-            extraction_result.source_pdf,
-            extraction_result.total_defects,
-        )
-
-        # Дедупликация
-        result = deduplicate_defects(extraction_result)
-
+        if args.print_duplicates or args.validate:
+            # Загружаем результат извлечения дефектов
+            extraction_result = await load_model(
+                json_path, DefectExtractionResult, validate=args.validate
+            )
+            logger.info(
+                "Загружен результат: %s, %d дефектов",
+                extraction_result.source_pdf,
+                extraction_result.total_defects,
+            )
+
+            # Дедупликация
+            result = deduplicate_defects(extraction_result, fuzzy_threshold=args.fuzzy_threshold)
+            summary = attrgetter(*_SUMMARY_FIELDS)(result)
+        else:
+            # Только пересохранение: работаем с сырым dict, без pydantic-моделей
+            result = deduplicate_defects_fast(
+                await load_json(json_path), fuzzy_threshold=args.fuzzy_threshold
+            )
+            summary = itemgetter(*_SUMMARY_FIELDS)(result)
+
+        source_pdf, total, unique, duplicate_groups, elapsed = summary
         print("\n=== DEDUPLICATION RESULT ===")
-        print("SOURCE_PDF:", result.source_pdf)
-        print("TOTAL_DEFECTS:", result.total_defects)
-        print("UNIQUE_DEFECTS:", result.unique_defects)
-        print("DUPLICATE_GROUPS:", result.duplicate_groups)
-        print("DUPLICATES_COUNT:", result.duplicates_count)
-        print("SECONDS:", f"{result.elapsed_seconds:.3f}")
+        print("SOURCE_PDF:", source_pdf)
+        print("TOTAL_DEFECTS:", total)
+        print("UNIQUE_DEFECTS:", unique)
+        print("DUPLICATE_GROUPS:", duplicate_groups)
+        print("DUPLICATES_COUNT:", total - unique)
+        print("SECONDS:", f"{elapsed:.3f}")
 
         if args.print_duplicates:
             # Показываем только дефекты с дубликатами
             dups = [d for d in result.defects if d.has_duplicates]
             if dups:
-                print(f"\n=== ДУБЛИКАТЫ ({len(dups)} дефектов) ===")
+                # Блоки собираются в список и выводятся одной записью
+                blocks = [f"\n=== ДУБЛИКАТЫ ({len(dups)} дефектов) ==="]
                 for d in dups:
-                    print(f"\n--- Строка {d.row_number} (стр. {d.page_number}) ---")
-                    print(f"Помещение: {d.room}")
-                    print(f"Локализация: {d.location}")
-                    print(f"Тип дефекта: {d.defect}")
-                    print(f"Дубликаты строк: {d.duplicates_str}")
+                    blocks.append(
+                        DUPLICATE_TEMPLATE.format(
+                            row=d.row_number,
+                            page=d.page_number,
+                            room=d.room,
+                            location=d.location,
+                            defect=d.defect,
+                            duplicates=d.duplicates_str,
+                        )
+                    )
+                sys.stdout.write("\n".join(blocks) + "\n")
             else:
                 print("\nДубликатов не найдено.")
 
-        # Сохраняем результат
-        json_out = await save_dedup_result(result, result_dir=out_dir)
+        # Сохраняем результат параллельно со сбросом выведенной сводки в stdout
+        json_out, _ = await asyncio.gather(
+            save_dedup_result(result, result_dir=out_dir),
+            asyncio.to_thread(sys.stdout.flush),
+        )
         print("\nJSON:", json_out)
 
         return 0
@@ -100,9 +140,21 @@ def main() -> int:
         action="store_true",
         help="Вывести найденные дубликаты в консоль",
     )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Полная pydantic-валидация входного JSON (по умолчанию — без проверки)",
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=DEDUP_FUZZY_THRESHOLD,
+        help="Порог нечёткого сравнения локализаций 0..1 (default: из config.py, "
+        "не задан — только точное совпадение)",
+    )
     args = parser.parse_args()
 
-    return asyncio.run(async_main(args))
+    return run_async(async_main(args))
 
 
 if __name__ == "__main__":
@@ -14,33 +14,39 @@
 from __future__ import annotations
 
 import argparse
-import asyncio
-import json
+import sys
 from pathlib import Path
 
 from config import logger
+from scripts._io import load_model
+from scripts._runtime import run_async
 from services.vlm_page_cleaner import VLMCleaningResult
-from services.defect_extractor import extract_defects, save_extraction_result
+from services.defect_extractor import (
+    close_flowise_client,
+    extract_defects,
+    save_extraction_result,
+)
 
-
-def _load_vlm_result(json_path: Path) -> VLMCleaningResult:
-    """Загружает VLMCleaningResult из JSON файла."""
-    with json_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    return VLMCleaningResult(**data)
+DEFECT_TEMPLATE = """
+--- Дефект {i} (стр. {page}) ---
+Помещение: {room}
+Локализация: {location}
+Тип дефекта: {defect}
+Тип работы: {work_type}
+Текст: {text}..."""
 
 
 async def async_main(args: argparse.Namespace) -> int:
     """Async точка входа."""
-    json_path = Path(args.json).expanduser().resolve()
+    json_path = Path(args.json).expanduser().absolute()
     if not json_path.exists():
         raise SystemExit(f"VLM JSON не найден: {json_path}")
 
-    out_dir = Path(args.out_dir).expanduser().resolve()
+    out_dir = Path(args.out_dir).expanduser().absolute()
 
     try:
         # Загружаем VLM результат
-        vlm_result = _load_vlm_result(json_path)
+        vlm_result = await load_model(json_path, VLMCleaningResult, validate=args.validate)
         logger.info(
             "Загружен VLM результат: %s, %d страниц",
             vlm_result.source_pdf,
@@ -57,14 +63,21 @@ async def async_main(args: argparse.Namespace) -> int:
         print("SECONDS:", f"{result.elapsed_seconds:.2f}")
 
         if args.print_defects and result.defects:
-            print("\n=== DEFECTS ===")
+            # Блоки собираются в список и выводятся одной записью
+            blocks = ["\n=== DEFECTS ==="]
             for i, defect in enumerate(result.defects, 1):
-                print(f"\n--- Дефект {i} (стр. {defect.page_number}) ---")
-                print(f"Помещение: {defect.room}")
-                print(f"Локализация: {defect.location}")
-                print(f"Тип дефекта: {defect.defect}")
-                print(f"Тип работы: {defect.work_type}")
-                print(f"Текст: {defect.source_text[:200]}...")
+                blocks.append(
+                    DEFECT_TEMPLATE.format(
+                        i=i,
+                        page=defect.page_number,
+                        room=defect.room,
+                        location=defect.location,
+                        defect=defect.defect,
+                        work_type=defect.work_type,
+                        text=defect.source_text[:200],
+                    )
+                )
+            sys.stdout.write("\n".join(blocks) + "\n")
 
         # Сохраняем результат
         json_out = await save_extraction_result(result, result_dir=out_dir)
@@ -76,6 +89,9 @@ async def async_main(args: argparse.Namespace) -> int:
         logger.warning("Остановлено пользователем (Ctrl+C).")
         return 130
 
+    finally:
+        await close_flowise_client()
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(
@@ -92,9 +108,14 @@ def main() -> int:
         action="store_true",
         help="Вывести найденные дефекты в консоль",
     )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Полная pydantic-валидация входного JSON (по умолчанию — без проверки)",
+    )
     args = parser.parse_args()
 
-    return asyncio.run(async_main(args))
+    return run_async(async_main(args))
 
 
 if __name__ == "__main__":
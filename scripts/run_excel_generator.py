@@ -14,47 +14,24 @@
 from __future__ import annotations
 
 import argparse
-import json
 from pathlib import Path
 
 from config import logger
+from scripts._io import load_model
+from scripts._runtime import run_async
 from services.defect_deduplicator import DeduplicationResult
 from services.excel_generator import generate_excel_report
 
 
-def _load_dedup_result(json_path: Path) -> DeduplicationResult:
-    """Загружает DeduplicationResult из JSON файла."""
-    with json_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    return DeduplicationResult(**data)
-
-
-def main() -> int:
-    parser = argparse.ArgumentParser(
-        description="Генерация Excel отчёта по дефектам."
-    )
-    parser.add_argument(
-        "json", help="Путь к JSON результату дедупликации (dedup_*.json)"
-    )
-    parser.add_argument(
-        "--output",
-        default=None,
-        help="Полный путь к выходному Excel файлу",
-    )
-    parser.add_argument(
-        "--out-dir",
-        default="artifacts/excel",
-        help="Папка для сохранения (default: artifacts/excel)",
-    )
-    args = parser.parse_args()
-
-    json_path = Path(args.json).expanduser().resolve()
+async def async_main(args: argparse.Namespace) -> int:
+    """Async точка входа."""
+    json_path = Path(args.json).expanduser().absolute()
     if not json_path.exists():
         raise SystemExit(f"JSON файл не найден: {json_path}")
 
     try:
         # Загружаем результат дедупликации
-        dedup_result = _load_dedup_result(json_path)
+        dedup_result = await load_model(json_path, DeduplicationResult, validate=args.validate)
         logger.info(
             "Загружен результат: %s, %d дефектов",
             dedup_result.source_pdf,
@@ -82,5 +59,32 @@ def main() -> int:
         return 130
 
 
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Генерация Excel отчёта по дефектам."
+    )
+    parser.add_argument(
+        "json", help="Путь к JSON результату дедупликации (dedup_*.json)"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Полный путь к выходному Excel файлу",
+    )
+    parser.add_argument(
+        "--out-dir",
+        default="artifacts/excel",
+        help="Папка для сохранения (default: artifacts/excel)",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Полная pydantic-валидация входного JSON (по умолчанию — без проверки)",
+    )
+    args = parser.parse_args()
+
+    return run_async(async_main(args))
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -10,38 +10,22 @@ import argparse
 from pathlib import Path
 
 from config import logger
+from scripts._runtime import run_async
 from services.flowise_page_filter import filter_relevant_pages, save_filter_result
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser(
-        description="Фильтрация релевантных страниц через Flowise LLM (FSM)."
-    )
-    parser.add_argument("txt", help="Путь к OCR .txt файлу (формат: === Страница N ===)")
-    parser.add_argument(
-        "--max-pages", type=int, default=0, help="0 = без лимита (обработать все страницы)"
-    )
-    parser.add_argument(
-        "--batch-size",
-        type=int,
-        default=0,
-        help="Размер батча страниц (0 = значение из config.py)",
-    )
-    parser.add_argument(
-        "--out-dir", default="artifacts/page_filter", help="Куда сохранить JSON результат"
-    )
-    args = parser.parse_args()
-
-    txt_path = Path(args.txt).expanduser().resolve()
+async def async_main(args: argparse.Namespace) -> int:
+    """Async точка входа."""
+    txt_path = Path(args.txt).expanduser().absolute()
     if not txt_path.exists():
         raise SystemExit(f"OCR файл не найден: {txt_path}")
 
     max_pages = args.max_pages or None
     batch_size = args.batch_size or None
-    out_dir = Path(args.out_dir).expanduser().resolve()
+    out_dir = Path(args.out_dir).expanduser().absolute()
 
     try:
-        result = filter_relevant_pages(txt_path, max_pages=max_pages, batch_size=batch_size)
+        result = await filter_relevant_pages(txt_path, max_pages=max_pages, batch_size=batch_size)
 
         print("\n=== PAGE FILTER RESULT ===")
         print("TXT_PATH:", result.txt_path)
@@ -53,7 +37,7 @@ def main() -> int:
         print("FSM_STATE:", result.fsm_final_state)
         print("SECONDS:", f"{result.elapsed_seconds:.2f}")
 
-        json_path = save_filter_result(result, result_dir=out_dir)
+        json_path = save_filter_result(result, result_dir=out_dir, pretty=args.pretty)
         print("JSON:", json_path)
 
         return 0
@@ -63,5 +47,32 @@ def main() -> int:
         return 130
 
 
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Фильтрация релевантных страниц через Flowise LLM (FSM)."
+    )
+    parser.add_argument("txt", help="Путь к OCR .txt файлу (формат: === Страница N ===)")
+    parser.add_argument(
+        "--max-pages", type=int, default=0, help="0 = без лимита (обработать все страницы)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="Размер батча страниц (0 = значение из config.py)",
+    )
+    parser.add_argument(
+        "--out-dir", default="artifacts/page_filter", help="Куда сохранить JSON результат"
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Сохранить JSON с отступами (по умолчанию — компактный)",
+    )
+    args = parser.parse_args()
+
+    return run_async(async_main(args))
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
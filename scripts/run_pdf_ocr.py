@@ -7,10 +7,10 @@
 from __future__ import annotations
 
 import argparse
-import asyncio
 from pathlib import Path
 
 from config import logger
+from scripts._runtime import run_async
 from services.ocr_service import process_pdf_ocr, save_ocr_result
 
 
@@ -51,16 +51,16 @@ def main() -> int:
     parser.add_argument("--print-text", action="store_true", help="Печатать распознанный текст в консоль")
     args = parser.parse_args()
 
-    pdf = Path(args.pdf).expanduser().resolve()
+    pdf = Path(args.pdf).expanduser().absolute()
     if not pdf.exists():
         raise SystemExit(f"PDF не найден: {pdf}")
 
     max_pages = args.max_pages or None
     concurrency = args.concurrency or None
-    out_dir = Path(args.out_dir).expanduser().resolve()
+    out_dir = Path(args.out_dir).expanduser().absolute()
 
     try:
-        return asyncio.run(
+        return run_async(
             _main_async(
                 pdf,
                 max_pages=max_pages,
@@ -7,6 +7,7 @@
 from __future__ import annotations
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from config import logger
@@ -24,7 +25,7 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    pdf = Path(args.pdf).expanduser().resolve()
+    pdf = Path(args.pdf).expanduser().absolute()
     if not pdf.exists():
         raise SystemExit(f"PDF не найден: {pdf}")
 
@@ -37,12 +38,13 @@ def main() -> None:
     print("PAGES:", len(result.pages))
 
     # Быстрая sanity-проверка: все файлы реально созданы.
-    missing = []
-    for page in result.pages:
-        if not page.rendered_path.exists():
-            missing.append(str(page.rendered_path))
-        if not page.preprocessed_path.exists():
-            missing.append(str(page.preprocessed_path))
+    # stat() на сетевых ФС может занимать десятки мс — проверяем пулом потоков.
+    # rendered_path нет при рендере через PyMuPDF (сразу preprocessed файл)
+    paths = [page.rendered_path for page in result.pages if page.rendered_path]
+    paths += [page.preprocessed_path for page in result.pages]
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        exists = list(executor.map(Path.exists, paths))
+    missing = [str(path) for path, ok in zip(paths, exists) if not ok]
 
     if missing:
         logger.warning("Не найдены файлы (проверьте права/диск): %s", missing[:5])
@@ -11,62 +11,67 @@
 from __future__ import annotations
 
 import argparse
-import asyncio
+import sys
 from pathlib import Path
 
 from config import logger
+from scripts._runtime import run_async
 from services.pipeline import run_pipeline, PipelineResult
+from services.defect_extractor import close_flowise_client
 
 
 def _print_result(result: PipelineResult) -> None:
-    """Выводит красивую сводку результата пайплайна."""
-    print("\n" + "=" * 60)
-    print("РЕЗУЛЬТАТ ПАЙПЛАЙНА")
-    print("=" * 60)
-
-    print(f"Папка артефактов: {result.pipeline_dir}")
-    print(f"Исходный URL: {result.source_url}")
+    """Выводит красивую сводку результата пайплайна (одной записью в stdout)."""
+    lines = [
+        "",
+        "=" * 60,
+        "РЕЗУЛЬТАТ ПАЙПЛАЙНА",
+        "=" * 60,
+        f"Папка артефактов: {result.pipeline_dir}",
+        f"Исходный URL: {result.source_url}",
+    ]
 
     if result.pdf_path:
-        print(f"PDF файл: {result.pdf_path}")
+        lines.append(f"PDF файл: {result.pdf_path}")
 
-    print("\n--- МЕТРИКИ ШАГОВ ---")
+    lines.append("\n--- МЕТРИКИ ШАГОВ ---")
 
     if result.download:
-        print(f"[1] Download: {result.download.filename} "
-              f"({result.download.size_bytes / 1024 / 1024:.2f} МБ) — {result.download.duration:.2f}с")
+        lines.append(f"[1] Download: {result.download.filename} "
+                     f"({result.download.size_bytes / 1024 / 1024:.2f} МБ) — {result.download.duration:.2f}с")
 
     if result.ocr:
-        print(f"[2] OCR: {result.ocr.total_pages} страниц — {result.ocr.duration:.2f}с")
+        lines.append(f"[2] OCR: {result.ocr.total_pages} страниц — {result.ocr.duration:.2f}с")
 
     if result.filter:
-        print(f"[3] Filter: {len(result.filter.relevant_pages)}/{result.filter.total_pages} "
-              f"релевантных [{result.filter.start_page}-{result.filter.end_page}] — {result.filter.duration:.2f}с")
+        lines.append(f"[3] Filter: {len(result.filter.relevant_pages)}/{result.filter.total_pages} "
+                     f"релевантных [{result.filter.start_page}-{result.filter.end_page}] — {result.filter.duration:.2f}с")
 
     if result.vlm:
-        print(f"[4] VLM: {result.vlm.processed_pages} страниц — {result.vlm.duration:.2f}с")
+        lines.append(f"[4] VLM: {result.vlm.processed_pages} страниц — {result.vlm.duration:.2f}с")
 
     if result.extraction:
-        print(f"[5] Extraction: {result.extraction.total_defects} дефектов — {result.extraction.duration:.2f}с")
+        lines.append(f"[5] Extraction: {result.extraction.total_defects} дефектов — {result.extraction.duration:.2f}с")
 
     if result.deduplication:
-        print(f"[6] Dedup: {result.deduplication.unique_defects}/{result.deduplication.total_defects} "
-              f"уникальных, {result.deduplication.duplicate_groups} групп — {result.deduplication.duration:.2f}с")
+        lines.append(f"[6] Dedup: {result.deduplication.unique_defects}/{result.deduplication.total_defects} "
+                     f"уникальных, {result.deduplication.duplicate_groups} групп — {result.deduplication.duration:.2f}с")
 
     if result.excel:
-        print(f"[7] Excel: {result.excel.excel_path} — {result.excel.duration:.2f}с")
+        lines.append(f"[7] Excel: {result.excel.excel_path} — {result.excel.duration:.2f}с")
 
-    print(f"\nОбщее время: {result.total_duration:.2f}с")
+    lines.append(f"\nОбщее время: {result.total_duration:.2f}с")
 
     if result.errors:
-        print("\n--- ОШИБКИ ---")
-        for err in result.errors:
-            print(f"  ! {err}")
+        lines.append("\n--- ОШИБКИ ---")
+        lines.extend(f"  ! {err}" for err in result.errors)
 
     if result.excel_path:
-        print(f"\n>>> EXCEL ОТЧЁТ: {result.excel_path}")
+        lines.append(f"\n>>> EXCEL ОТЧЁТ: {result.excel_path}")
     else:
-        print("\n>>> Excel отчёт не создан (проверьте ошибки выше)")
+        lines.append("\n>>> Excel отчёт не создан (проверьте ошибки выше)")
+
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 async def _async_main(url: str, out_dir: str | None) -> int:
@@ -85,6 +90,9 @@ async def _async_main(url: str, out_dir: str | None) -> int:
         logger.warning("Остановлено пользователем (Ctrl+C)")
         return 130
 
+    finally:
+        await close_flowise_client()
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(
@@ -101,7 +109,7 @@ def main() -> int:
     )
     args = parser.parse_args()
 
-    return asyncio.run(_async_main(args.url, args.out_dir))
+    return run_async(_async_main(args.url, args.out_dir))
 
 
 if __name__ == "__main__":
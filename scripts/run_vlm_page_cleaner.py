@@ -22,8 +22,13 @@ import re
 from pathlib import Path
 
 from config import logger
+from scripts._runtime import run_async
 from services.vlm_page_cleaner import clean_relevant_pages, save_vlm_result
 
+# Маркер страницы в OCR txt и элемент --pages (одиночная страница или диапазон)
+_PAGE_MARKER_RE = re.compile(r"=== Страница (\d+)[^=]*===")
+_PAGE_OR_RANGE_RE = re.compile(r"(\d+)(?:\s*-\s*(\d+))?")
+
 
 def _parse_pages_arg(pages_str: str) -> list[int]:
     """Парсит строку с номерами страниц.
@@ -34,46 +39,59 @@ def _parse_pages_arg(pages_str: str) -> list[int]:
       - Диапазоны: "5-10"
       - Комбинации: "1,3,5-10,15"
     """
-    result: list[int] = []
+    result: set[int] = set()
+
+    # Один проход regex по всей строке: пары (start, end), end пуст для одиночных
+    for start, end in _PAGE_OR_RANGE_RE.findall(pages_str):
+        result.update(range(int(start), int(end or start) + 1))
+
+    return sorted(result)
+
 
-    for part in pages_str.split(","):
-        part = part.strip()
-        if "-" in part:
-            # Диапазон
-            match = re.match(r"(\d+)-(\d+)", part)
-            if match:
-                start, end = int(match.group(1)), int(match.group(2))
-                result.extend(range(start, end + 1))
-        elif part.isdigit():
-            result.append(int(part))
+def _parse_ocr_txt(txt_path: Path, wanted: set[int]) -> dict[int, str]:
+    """Парсит OCR txt файл (формат: === Страница N ===) в словарь.
 
-    return sorted(set(result))
+    Файл читается построчно, текст копится только для страниц из `wanted`
+    (остальные строки пропускаются): память — O(запрошенных страниц),
+    а не всего документа.
 
+    Args:
+        txt_path: Путь к OCR txt файлу
+        wanted: Номера страниц, текст которых нужен
 
-def _parse_ocr_txt(txt_path: Path) -> dict[int, str]:
-    """Парсит OCR txt файл (формат: === Страница N ===) в словарь."""
+    Returns:
+        Словарь {номер страницы: текст} только для страниц из `wanted`
+    """
     if not txt_path.exists():
         return {}
 
-    content = txt_path.read_text(encoding="utf-8")
     raw_text_by_page: dict[int, str] = {}
-
-    # Разбиваем по маркерам страниц
-    pattern = r"=== Страница (\d+)[^=]*==="
-    parts = re.split(pattern, content)
-
-    # parts: ['', '1', 'текст1', '2', 'текст2', ...]
-    for i in range(1, len(parts) - 1, 2):
-        page_num = int(parts[i])
-        page_text = parts[i + 1].strip()
-        raw_text_by_page[page_num] = page_text
+    current_page: int | None = None
+    buf: list[str] | None = None  # None — текущая страница не нужна
+
+    with txt_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            match = _PAGE_MARKER_RE.match(line)
+            if match is None:
+                if buf is not None:
+                    buf.append(line)
+                continue
+
+            if buf is not None:
+                raw_text_by_page[current_page] = "".join(buf).strip()
+            current_page = int(match.group(1))
+            # Текст после маркера на той же строке (если есть) относится к странице
+            buf = [line[match.end():]] if current_page in wanted else None
+
+    if buf is not None:
+        raw_text_by_page[current_page] = "".join(buf).strip()
 
     return raw_text_by_page
 
 
 async def async_main(args: argparse.Namespace) -> int:
     """Async точка входа."""
-    pdf_path = Path(args.pdf).expanduser().resolve()
+    pdf_path = Path(args.pdf).expanduser().absolute()
     if not pdf_path.exists():
         raise SystemExit(f"PDF не найден: {pdf_path}")
 
@@ -81,14 +99,16 @@ async def async_main(args: argparse.Namespace) -> int:
     if not page_numbers:
         raise SystemExit("Не указаны страницы для обработки (--pages)")
 
-    out_dir = Path(args.out_dir).expanduser().resolve()
+    out_dir = Path(args.out_dir).expanduser().absolute()
 
     # Опциональный fallback из OCR
     raw_text_by_page: dict[int, str] | None = None
     if args.ocr_txt:
-        ocr_txt_path = Path(args.ocr_txt).expanduser().resolve()
+        ocr_txt_path = Path(args.ocr_txt).expanduser().absolute()
         if ocr_txt_path.exists():
-            raw_text_by_page = _parse_ocr_txt(ocr_txt_path)
+            raw_text_by_page = await asyncio.to_thread(
+                _parse_ocr_txt, ocr_txt_path, set(page_numbers)
+            )
             logger.info("Загружен OCR fallback: %d страниц", len(raw_text_by_page))
 
     try:
@@ -149,7 +169,7 @@ def main() -> int:
     )
     args = parser.parse_args()
 
-    return asyncio.run(async_main(args))
+    return run_async(async_main(args))
 
 
 if __name__ == "__main__":
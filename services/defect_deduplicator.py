@@ -3,21 +3,41 @@
 Группирует дефекты по ключам (room, location, defect) и помечает дубликаты.
 Не удаляет дубли, а добавляет информацию о них для отображения в Excel.
 
+Опционально (DEDUP_FUZZY_THRESHOLD, нужен rapidfuzz) группы с одинаковыми
+room/defect и похожей локализацией (опечатки, пробелы) объединяются.
+
 Публичный API:
     - deduplicate_defects() — основная функция обработки
+    - deduplicate_defects_fast() — то же на сыром JSON dict, без pydantic
     - save_dedup_result() — сохранение результата в JSON
 """
 
 from __future__ import annotations
 
+import asyncio
+import logging
 import time
 from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import attrgetter, itemgetter
 from pathlib import Path
+from typing import Annotated, Any
 
+import orjson
 from pydantic import BaseModel, Field
 
-from config import logger
-from services.defect_extractor import DefectExtractionResult, ExtractedDefect
+from config import DEDUP_FUZZY_THRESHOLD, logger
+from services.defect_extractor import DefectExtractionResult
+
+# rapidfuzz — быстрое нечёткое сравнение строк (C++), нужен только для fuzzy режима
+try:
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import JaroWinkler
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
 
 
 # =============================================================================
@@ -25,36 +45,41 @@ from services.defect_extractor import DefectExtractionResult, ExtractedDefect
 # =============================================================================
 
 
-class DeduplicatedDefect(BaseModel):
-    """Дефект с информацией о дубликатах."""
+@dataclass(slots=True)
+class DeduplicatedDefect:
+    """Дефект с информацией о дубликатах.
+
+    Stdlib dataclass со __slots__ (а не BaseModel): дефектов в документе тысячи,
+    экземпляры без __dict__ заметно компактнее. Внутри DeduplicationResult
+    поля всё равно валидируются pydantic при загрузке из JSON.
+    """
 
     # Оригинальные поля из ExtractedDefect
-    source_text: str = Field(..., description="Исходный текст описания дефекта")
-    room: str = Field(..., description="Помещение")
-    location: str = Field(..., description="Локализация дефекта")
-    defect: str = Field(..., description="Тип дефекта")
-    work_type: str = Field(..., description="Тип работы")
-    page_number: int = Field(..., description="Номер страницы")
+    source_text: str  # Исходный текст описания дефекта
+    room: str  # Помещение
+    location: str  # Локализация дефекта
+    defect: str  # Тип дефекта
+    work_type: str  # Тип работы
+    page_number: int  # Номер страницы
 
     # Новые поля для дедупликации
-    row_number: int = Field(..., description="Номер строки в списке (1-based)")
-    duplicates: list[int] = Field(
-        default_factory=list,
-        description="Номера строк дубликатов (пусто если нет дублей)",
+    row_number: int  # Номер строки в списке (1-based)
+    duplicates: tuple[int, ...] = ()  # Номера строк дубликатов (в JSON — список)
+
+    # Строка с номерами дубликатов для Excel (пусто если нет). Собирается один раз
+    # при создании, а не при каждом обращении; в JSON не сохраняется.
+    duplicates_str: Annotated[str, Field(exclude=True)] = field(
+        default="", init=False, repr=False, compare=False
     )
 
+    def __post_init__(self) -> None:
+        self.duplicates_str = ", ".join(map(str, self.duplicates))
+
     @property
     def has_duplicates(self) -> bool:
         """Есть ли дубликаты у этого дефекта."""
         return len(self.duplicates) > 0
 
-    @property
-    def duplicates_str(self) -> str:
-        """Строка с номерами дубликатов для Excel (пусто если нет)."""
-        if not self.duplicates:
-            return ""
-        return ", ".join(str(n) for n in self.duplicates)
-
 
 class DeduplicationResult(BaseModel):
     """Результат дедупликации дефектов."""
@@ -79,19 +104,152 @@ class DeduplicationResult(BaseModel):
 # =============================================================================
 
 
-def _make_dedup_key(defect: ExtractedDefect) -> tuple[str, str, str]:
-    """Создаёт ключ для группировки дефектов.
+@lru_cache(maxsize=4096)
+def _normalize(value: str) -> str:
+    """Нормализует поле ключа: без краевых пробелов, casefold.
 
-    Ключ: (room, location, defect) — нормализованные к нижнему регистру.
+    Значения room/location/defect берутся из небольшого словаря и сильно
+    повторяются, поэтому кэш сводит N нормализаций к размеру словаря.
     """
-    return (
-        defect.room.strip().lower(),
-        defect.location.strip().lower(),
-        defect.defect.strip().lower(),
-    )
+    if value[:1].isspace() or value[-1:].isspace():
+        value = value.strip()
+    return value.casefold()
+
+
+# Поля ключа: у модели — attrgetter, у сырого JSON dict — itemgetter
+# (чтение трёх полей одним вызовом на C, результат — кортеж)
+_DEFECT_KEY_ATTRS = attrgetter("room", "location", "defect")
+_DEFECT_KEY_ITEMS = itemgetter("room", "location", "defect")
+
+
+def _make_dedup_keys(
+    key_fields: Iterable[tuple[str, str, str]],
+) -> list[tuple[str, str, str]]:
+    """Создаёт ключи для группировки дефектов.
+
+    Ключ: (room, location, defect) — без краевых пробелов, casefold.
+
+    Args:
+        key_fields: Кортежи (room, location, defect) в порядке строк
+
+    Returns:
+        Нормализованные ключи в том же порядке
+    """
+    return [
+        (_normalize(room), _normalize(location), _normalize(defect))
+        for room, location, defect in key_fields
+    ]
 
 
-def deduplicate_defects(extraction_result: DefectExtractionResult) -> DeduplicationResult:
+def _merge_fuzzy_groups(
+    groups: dict[tuple[str, str, str], list[int]],
+    threshold: float,
+) -> dict[tuple[str, str, str], list[int]]:
+    """Объединяет группы с одинаковыми room/defect и похожей локализацией.
+
+    Группы блокируются по (room, defect), внутри блока локализации сравниваются
+    попарно (rapidfuzz cdist, Jaro-Winkler), пары выше порога объединяются
+    через union-find.
+
+    Args:
+        groups: Группы точного совпадения key -> номера строк
+        threshold: Порог сходства локализаций (0..1)
+
+    Returns:
+        Объединённые группы (ключ — первый ключ группы)
+    """
+    keys = list(groups)
+    parent = list(range(len(keys)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    blocks: dict[tuple[str, str], list[int]] = defaultdict(list)
+    for idx, (room, _, defect) in enumerate(keys):
+        blocks[(room, defect)].append(idx)
+
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        locations = [keys[i][1] for i in members]
+        scores = rf_process.cdist(
+            locations,
+            locations,
+            scorer=JaroWinkler.normalized_similarity,
+            score_cutoff=threshold,
+        )
+        for a, b in zip(*scores.nonzero()):
+            if a < b:
+                root_a, root_b = find(members[a]), find(members[b])
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    merged: dict[tuple[str, str, str], list[int]] = defaultdict(list)
+    for idx, key in enumerate(keys):
+        merged[keys[find(idx)]].extend(groups[key])
+    for row_numbers in merged.values():
+        row_numbers.sort()
+    return merged
+
+
+# Общий пустой кортеж для дефектов без дублей (их большинство)
+_NO_DUPLICATES: tuple[int, ...] = ()
+
+
+def _find_duplicates(
+    keys: list[tuple[str, str, str]],
+    fuzzy_threshold: float | None,
+) -> tuple[int, int, dict[int, tuple[int, ...]]]:
+    """Группирует строки по ключам и строит карту дубликатов.
+
+    Args:
+        keys: Ключи дедупликации в порядке строк
+        fuzzy_threshold: Порог нечёткого сравнения локализаций (None — только
+            точное совпадение ключа)
+
+    Returns:
+        (количество уникальных групп, количество групп дублей,
+        row_number -> номера строк-дубликатов)
+    """
+    # Шаг 1: Группируем дефекты по ключу
+    # key -> list of row_number (1-based для Excel)
+    groups: dict[tuple[str, str, str], list[int]] = defaultdict(list)
+    get_group = groups.__getitem__
+
+    for row_number, key in enumerate(keys, 1):
+        get_group(key).append(row_number)
+
+    if fuzzy_threshold is not None:
+        if RAPIDFUZZ_AVAILABLE:
+            groups = _merge_fuzzy_groups(groups, fuzzy_threshold)
+        else:
+            logger.warning("rapidfuzz не установлен — нечёткая дедупликация отключена")
+
+    # Шаг 2: Для каждого дефекта из группы дублей — список остальных строк группы
+    # row_number -> list of duplicate row_numbers
+    duplicate_groups = [rows for rows in groups.values() if len(rows) > 1]
+    # Номера строк в группе уникальны — «остальные» это два среза вокруг i
+    # (копирование на C вместо фильтрации всей группы для каждого члена)
+    duplicates_map: dict[int, tuple[int, ...]] = {
+        row_num: tuple(rows[:i] + rows[i + 1:])
+        for rows in duplicate_groups
+        for i, row_num in enumerate(rows)
+    }
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for rows in duplicate_groups:
+            logger.debug("Группа дубликатов: строки %s", rows)
+
+    return len(groups), len(duplicate_groups), duplicates_map
+
+
+def deduplicate_defects(
+    extraction_result: DefectExtractionResult,
+    fuzzy_threshold: float | None = DEDUP_FUZZY_THRESHOLD,
+) -> DeduplicationResult:
     """Помечает дубликаты в списке дефектов.
 
     Дубликаты определяются по совпадению ключа (room, location, defect).
@@ -100,11 +258,13 @@ def deduplicate_defects(extraction_result: DefectExtractionResult) -> Deduplicat
 
     Args:
         extraction_result: Результат извлечения дефектов из defect_extractor
+        fuzzy_threshold: Порог нечёткого сравнения локализаций (None — только
+            точное совпадение ключа)
 
     Returns:
         DeduplicationResult с помеченными дубликатами
     """
-    start_time = time.perf_counter()
+    start_ns = time.monotonic_ns()
 
     defects = extraction_result.defects
     total = len(defects)
@@ -122,60 +282,35 @@ def deduplicate_defects(extraction_result: DefectExtractionResult) -> Deduplicat
 
     logger.info("Дедупликация: %d дефектов из %s", total, extraction_result.source_pdf)
 
-    # Шаг 1: Группируем дефекты по ключу
-    # key -> list of (row_number, defect)
-    groups: dict[tuple[str, str, str], list[tuple[int, ExtractedDefect]]] = defaultdict(list)
-
-    for idx, defect in enumerate(defects):
-        row_number = idx + 1  # 1-based для Excel
-        key = _make_dedup_key(defect)
-        groups[key].append((row_number, defect))
-
-    # Шаг 2: Для каждой группы определяем дубликаты
-    # row_number -> list of duplicate row_numbers
-    duplicates_map: dict[int, list[int]] = {}
-
-    duplicate_groups_count = 0
-    for key, group_items in groups.items():
-        if len(group_items) > 1:
-            # Это группа дубликатов
-            duplicate_groups_count += 1
-            row_numbers = [row for row, _ in group_items]
-
-            # Для каждого дефекта в группе — список остальных
-            for row_num in row_numbers:
-                duplicates_map[row_num] = [r for r in row_numbers if r != row_num]
-
-            logger.debug(
-                "Группа дубликатов: %s → строки %s",
-                key,
-                row_numbers,
-            )
-
-    # Шаг 3: Создаём результат с пометками
-    deduplicated: list[DeduplicatedDefect] = []
-
-    for idx, defect in enumerate(defects):
-        row_number = idx + 1
-        dups = duplicates_map.get(row_number, [])
+    # Ключи нормализуются один проход
+    keys = _make_dedup_keys(map(_DEFECT_KEY_ATTRS, defects))
+    unique_count, duplicate_groups_count, duplicates_map = _find_duplicates(
+        keys, fuzzy_threshold
+    )
 
-        deduplicated.append(
+    # Шаг 3: Создаём результат с пометками. Поля ExtractedDefect берутся
+    # из __dict__ модели целиком (без чтения атрибутов по одному)
+    if duplicates_map:
+        deduplicated = [
             DeduplicatedDefect(
-                source_text=defect.source_text,
-                room=defect.room,
-                location=defect.location,
-                defect=defect.defect,
-                work_type=defect.work_type,
-                page_number=defect.page_number,
+                **defect.__dict__,
                 row_number=row_number,
-                duplicates=dups,
+                duplicates=duplicates_map.get(row_number, _NO_DUPLICATES),
             )
-        )
-
-    unique_count = len(groups)  # количество уникальных ключей
-    elapsed = time.perf_counter() - start_time
-
-    result = DeduplicationResult(
+            for row_number, defect in enumerate(defects, 1)
+        ]
+    else:
+        # Дублей нет (частый случай для коротких отчётов) — без поиска по карте
+        deduplicated = [
+            DeduplicatedDefect(**defect.__dict__, row_number=row_number)
+            for row_number, defect in enumerate(defects, 1)
+        ]
+
+    elapsed = (time.monotonic_ns() - start_ns) / 1e9
+
+    # Вход — уже валидный DefectExtractionResult, поэтому результат
+    # собирается без повторной валидации
+    result = DeduplicationResult.model_construct(
         source_pdf=extraction_result.source_pdf,
         total_defects=total,
         unique_defects=unique_count,
@@ -195,33 +330,99 @@ def deduplicate_defects(extraction_result: DefectExtractionResult) -> Deduplicat
     return result
 
 
+def deduplicate_defects_fast(
+    extraction_data: dict[str, Any],
+    fuzzy_threshold: float | None = DEDUP_FUZZY_THRESHOLD,
+) -> dict[str, Any]:
+    """Вариант deduplicate_defects для сырого JSON без pydantic-моделей.
+
+    Для сценария «загрузить defects_*.json → пометить дубли → сохранить»:
+    тысячи ExtractedDefect/DeduplicatedDefect не создаются, результат —
+    dict в формате DeduplicationResult.model_dump(mode="json").
+
+    Args:
+        extraction_data: Распарсенный JSON результата defect_extractor
+        fuzzy_threshold: Порог нечёткого сравнения локализаций (None — только
+            точное совпадение ключа)
+
+    Returns:
+        dict с полями DeduplicationResult
+    """
+    start_ns = time.monotonic_ns()
+
+    source_pdf = extraction_data["source_pdf"]
+    defects: list[dict[str, Any]] = extraction_data.get("defects", [])
+    total = len(defects)
+    logger.info("Дедупликация: %d дефектов из %s", total, source_pdf)
+
+    keys = _make_dedup_keys(map(_DEFECT_KEY_ITEMS, defects))
+    unique_count, duplicate_groups_count, duplicates_map = _find_duplicates(
+        keys, fuzzy_threshold
+    )
+
+    deduplicated = [
+        {
+            "source_text": defect["source_text"],
+            "room": defect["room"],
+            "location": defect["location"],
+            "defect": defect["defect"],
+            "work_type": defect["work_type"],
+            "page_number": defect.get("page_number", 0),
+            "row_number": row_number,
+            "duplicates": duplicates_map.get(row_number, _NO_DUPLICATES),
+        }
+        for row_number, defect in enumerate(defects, 1)
+    ]
+
+    elapsed = (time.monotonic_ns() - start_ns) / 1e9
+    logger.info(
+        "Дедупликация завершена: %d дефектов, %d уникальных, %d групп дублей (%.3f сек)",
+        total,
+        unique_count,
+        duplicate_groups_count,
+        elapsed,
+    )
+
+    return {
+        "source_pdf": source_pdf,
+        "total_defects": total,
+        "unique_defects": unique_count,
+        "duplicate_groups": duplicate_groups_count,
+        "defects": deduplicated,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
 # =============================================================================
 # Сохранение результата
 # =============================================================================
 
 
 async def save_dedup_result(
-    result: DeduplicationResult,
+    result: DeduplicationResult | dict[str, Any],
     result_dir: str | Path = "artifacts/dedup",
 ) -> str:
     """Сохраняет результат дедупликации в JSON файл.
 
     Args:
-        result: Результат дедупликации
+        result: Результат дедупликации (модель или dict из deduplicate_defects_fast)
         result_dir: Папка для сохранения
 
     Returns:
         Путь к сохранённому JSON файлу
     """
     result_path = Path(result_dir).expanduser().resolve()
-    result_path.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(result_path.mkdir, parents=True, exist_ok=True)
 
-    pdf_stem = Path(result.source_pdf).stem
+    data = result if isinstance(result, dict) else result.model_dump(mode="json")
+    pdf_stem = Path(data["source_pdf"]).stem
     json_file = result_path / f"dedup_{pdf_stem}.json"
 
     logger.info("Сохраняю результат дедупликации: %s", json_file)
 
-    json_file.write_text(result.model_dump_json(indent=2), encoding="utf-8")
+    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    # Запись на диск — в потоке, чтобы не блокировать event loop
+    await asyncio.to_thread(json_file.write_bytes, payload)
 
     logger.info("Результат дедупликации сохранён")
     return str(json_file)
@@ -3,6 +3,9 @@
 Принимает результат дедупликации и создаёт форматированный Excel файл
 с колонками для всех полей дефектов и пометками дубликатов.
 
+Файл пишется через xlsxwriter в режиме constant_memory: строки сбрасываются
+на диск по мере записи, память не зависит от количества дефектов.
+
 Публичный API:
     - generate_excel_report() — основная функция генерации
 """
@@ -11,10 +14,9 @@ from __future__ import annotations
 
 import time
 from pathlib import Path
+from typing import Any
 
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
+import xlsxwriter
 
 from config import logger
 from services.defect_deduplicator import DeduplicationResult
@@ -25,25 +27,31 @@ from utils.defect_catalog import get_defect_name_ru
 # Настройки стилей Excel
 # =============================================================================
 
+# Границы
+THIN_BORDER: dict[str, Any] = {"border": 1}
+
 # Заголовок таблицы
-HEADER_FONT = Font(bold=True, size=11, color="FFFFFF")
-HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
+HEADER_FORMAT: dict[str, Any] = {
+    "bold": True,
+    "font_size": 11,
+    "font_color": "#FFFFFF",
+    "bg_color": "#4472C4",
+    "pattern": 1,
+    "align": "center",
+    "valign": "vcenter",
+    "text_wrap": True,
+    **THIN_BORDER,
+}
 
 # Ячейки данных
-DATA_ALIGNMENT = Alignment(vertical="top", wrap_text=True)
-DATA_ALIGNMENT_CENTER = Alignment(horizontal="center", vertical="top")
+DATA_ALIGNMENT: dict[str, Any] = {"valign": "top", "text_wrap": True}
+DATA_ALIGNMENT_CENTER: dict[str, Any] = {"align": "center", "valign": "top"}
 
 # Дубликаты (подсветка)
-DUPLICATE_FILL = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+DUPLICATE_FILL: dict[str, Any] = {"bg_color": "#FFF2CC", "pattern": 1}
 
-# Границы
-THIN_BORDER = Border(
-    left=Side(style="thin"),
-    right=Side(style="thin"),
-    top=Side(style="thin"),
-    bottom=Side(style="thin"),
-)
+# Колонки с выравниванием по центру: №, Страница, Дубликаты
+CENTER_COLUMNS = frozenset({1, 2, 8})
 
 # Ширина колонок
 COLUMN_WIDTHS = {
@@ -69,12 +77,37 @@ HEADERS = [
     "Дубликаты",
 ]
 
+# Высота строк данных (авто не работает, ставим минимум для wrap_text)
+DATA_ROW_HEIGHT = 60
+
 
 # =============================================================================
 # Основная логика
 # =============================================================================
 
 
+def _build_row_formats(
+    wb: xlsxwriter.Workbook,
+) -> tuple[tuple[Any, ...], tuple[Any, ...]]:
+    """Создаёт форматы ячеек данных по колонкам.
+
+    Форматы создаются один раз на workbook (4 комбинации: выравнивание ×
+    подсветка дубликата) и переиспользуются для всех строк.
+
+    Returns:
+        (форматы колонок обычной строки, форматы колонок строки-дубликата)
+    """
+    left = wb.add_format({**DATA_ALIGNMENT, **THIN_BORDER})
+    left_dup = wb.add_format({**DATA_ALIGNMENT, **THIN_BORDER, **DUPLICATE_FILL})
+    center = wb.add_format({**DATA_ALIGNMENT_CENTER, **THIN_BORDER})
+    center_dup = wb.add_format({**DATA_ALIGNMENT_CENTER, **THIN_BORDER, **DUPLICATE_FILL})
+
+    columns = range(1, len(HEADERS) + 1)
+    plain = tuple(center if col in CENTER_COLUMNS else left for col in columns)
+    duplicate = tuple(center_dup if col in CENTER_COLUMNS else left_dup for col in columns)
+    return plain, duplicate
+
+
 def generate_excel_report(
     dedup_result: DeduplicationResult,
     output_path: str | Path | None = None,
@@ -107,60 +140,56 @@ def generate_excel_report(
         excel_path,
     )
 
-    # Создаём workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Дефекты"
+    excel_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Заголовки
-    for col_idx, header in enumerate(HEADERS, start=1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = HEADER_FONT
-        cell.fill = HEADER_FILL
-        cell.alignment = HEADER_ALIGNMENT
-        cell.border = THIN_BORDER
-
-    # Устанавливаем ширину колонок
+    # constant_memory: строки пишутся потоком (по порядку), а не держатся в памяти.
+    # Тексты дефектов пишутся как есть — без превращения в формулы/ссылки
+    wb = xlsxwriter.Workbook(
+        str(excel_path),
+        {
+            "constant_memory": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        },
+    )
+    ws = wb.add_worksheet("Дефекты")
+
+    # Ширина колонок и фиксация заголовка
     for col_letter, width in COLUMN_WIDTHS.items():
-        ws.column_dimensions[col_letter].width = width
+        ws.set_column(f"{col_letter}:{col_letter}", width)
+    ws.freeze_panes(1, 0)
 
-    # Фиксируем заголовок
-    ws.freeze_panes = "A2"
+    # Заголовки
+    ws.write_row(0, 0, HEADERS, wb.add_format(HEADER_FORMAT))
 
     # Данные
-    for row_idx, defect in enumerate(dedup_result.defects, start=2):
-        row_data = [
-            defect.row_number,
-            defect.page_number,
+    plain_formats, duplicate_formats = _build_row_formats(wb)
+
+    for row_idx, defect in enumerate(dedup_result.defects, start=1):
+        # Подсветка дубликатов
+        formats = duplicate_formats if defect.has_duplicates else plain_formats
+
+        ws.set_row(row_idx, DATA_ROW_HEIGHT)
+        # Типы колонок известны заранее: пишем типизированными методами,
+        # без разбора значения в ws.write() (и без превращения "{=...}" в формулу)
+        ws.write_number(row_idx, 0, defect.row_number, formats[0])
+        ws.write_number(row_idx, 1, defect.page_number, formats[1])
+        text_values = (
             defect.room,
             defect.location,
             get_defect_name_ru(defect.defect),  # Русское название из справочника
             defect.work_type,
             defect.source_text,
             defect.duplicates_str,
-        ]
-
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = THIN_BORDER
-
-            # Выравнивание
-            if col_idx in (1, 2, 8):  # №, Страница, Дубликаты
-                cell.alignment = DATA_ALIGNMENT_CENTER
+        )
+        for col_idx, value in enumerate(text_values, start=2):
+            if value:
+                ws.write_string(row_idx, col_idx, value, formats[col_idx])
             else:
-                cell.alignment = DATA_ALIGNMENT
-
-            # Подсветка дубликатов
-            if defect.has_duplicates:
-                cell.fill = DUPLICATE_FILL
-
-    # Высота строк (авто не работает, ставим минимум для wrap_text)
-    for row_idx in range(2, len(dedup_result.defects) + 2):
-        ws.row_dimensions[row_idx].height = 60
+                ws.write_blank(row_idx, col_idx, None, formats[col_idx])
 
     # Сохраняем
-    excel_path.parent.mkdir(parents=True, exist_ok=True)
-    wb.save(excel_path)
+    wb.close()
 
     elapsed = time.perf_counter() - start_time
 
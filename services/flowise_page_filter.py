@@ -13,14 +13,16 @@
 
 from __future__ import annotations
 
-import json
+import asyncio
+import bisect
 import re
 import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Literal
 
-import requests
+import httpx
+import orjson
 from pydantic import BaseModel, Field
 
 from config import (
@@ -30,6 +32,9 @@ from config import (
     FLOWISE_BATCH_SIZE,
     FLOWISE_TIMEOUT_SECONDS,
     FLOWISE_MAX_CHARS_PER_PAGE,
+    FLOWISE_SEARCH_CONCURRENCY,
+    FLOWISE_SEARCH_END_LOOKAHEAD,
+    FLOWISE_STORE_RAW_RESPONSE,
 )
 
 
@@ -191,6 +196,11 @@ class PageData(BaseModel):
 
     page_number: int = Field(..., description="Номер страницы (1..N).")
     text: str = Field(..., description="Текст страницы.")
+    preview: str = Field(
+        "",
+        exclude=True,
+        description="Обрезанный текст страницы для промпта (строится один раз при парсинге).",
+    )
 
 
 class BatchDebugInfo(BaseModel):
@@ -201,7 +211,9 @@ class BatchDebugInfo(BaseModel):
     elapsed_seconds: float = Field(..., description="Время выполнения запроса.")
     http_status: int | None = Field(None, description="HTTP статус ответа.")
     parsed_response: dict | None = Field(None, description="Распарсенный JSON ответ.")
-    raw_response: dict | None = Field(None, description="Сырой ответ Flowise.")
+    raw_response: dict | None = Field(
+        None, description="Сырой ответ Flowise (только при FLOWISE_STORE_RAW_RESPONSE)."
+    )
 
 
 class PageFilterResult(BaseModel):
@@ -229,38 +241,55 @@ class PageFilterResult(BaseModel):
 # Внутренние функции
 # -----------------------------
 
-def _parse_ocr_txt_file(txt_path: Path) -> list[PageData]:
+# Маркер страницы в OCR .txt: === Страница N ===
+_PAGE_MARKER_RE = re.compile(r"=== Страница (\d+) ===")
+
+
+def _page_number(page: PageData) -> int:
+    """Ключ сортировки/бинарного поиска страниц."""
+    return page.page_number
+
+
+def _parse_ocr_txt_file(txt_path: Path, max_chars: int) -> list[PageData]:
     """Парсит OCR .txt файл и извлекает страницы.
 
     Формат файла: === Страница N === текст...
+    Превью для промпта (max_chars символов, без переводов строк) считается
+    здесь один раз, а не в каждом батче обеих фаз.
     """
     logger.info("Парсинг OCR файла: %s", txt_path)
 
     content = txt_path.read_text(encoding="utf-8")
 
-    # Формат: === Страница N ===
-    pattern = r"=== Страница (\d+) ==="
-    parts = re.split(pattern, content)
+    # Текст страницы — срез между концом её маркера и началом следующего
+    # (без промежуточного списка re.split на весь файл)
+    matches = list(_PAGE_MARKER_RE.finditer(content))
 
     pages: list[PageData] = []
-    for i in range(1, len(parts), 2):
-        if i + 1 < len(parts):
-            page_num = int(parts[i])
-            page_text = parts[i + 1].strip()
-            if page_text:
-                pages.append(PageData(page_number=page_num, text=page_text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        page_text = content[match.end():end].strip()
+        if page_text:
+            pages.append(
+                PageData(
+                    page_number=int(match.group(1)),
+                    text=page_text,
+                    preview=page_text[:max_chars].replace("\n", " "),
+                )
+            )
 
     logger.info("Извлечено страниц: %s", len(pages))
     return pages
 
 
-def _format_pages_for_prompt(pages: list[PageData], max_chars: int) -> str:
+def _format_pages_for_prompt(pages: list[PageData]) -> str:
     """Форматирует страницы для промпта."""
-    lines: list[str] = []
-    for page in pages:
-        preview = page.text[:max_chars].replace("\n", " ")
-        lines.append(f"PAGE {page.page_number}: {preview}")
-    return "\n\n".join(lines)
+    return "\n\n".join(f"PAGE {page.page_number}: {page.preview}" for page in pages)
+
+
+# Markdown-ограждение ```json ... ``` вокруг JSON в текстовом ответе
+_FENCE_OPEN_RE = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_FENCE_CLOSE_RE = re.compile(r"\s*```\s*$")
 
 
 def _extract_json_response(flowise_response: Any) -> dict | None:
@@ -278,9 +307,9 @@ def _extract_json_response(flowise_response: Any) -> dict | None:
         if isinstance(val, str) and val.strip():
             try:
                 raw = val.strip()
-                raw = re.sub(r"^```(?:json)?\s*", "", raw, flags=re.IGNORECASE)
-                raw = re.sub(r"\s*```\s*$", "", raw)
-                parsed = json.loads(raw)
+                raw = _FENCE_OPEN_RE.sub("", raw)
+                raw = _FENCE_CLOSE_RE.sub("", raw)
+                parsed = orjson.loads(raw)
                 if isinstance(parsed, dict):
                     return parsed
             except Exception:
@@ -289,16 +318,23 @@ def _extract_json_response(flowise_response: Any) -> dict | None:
     return None
 
 
-def _post_flowise(api_url: str, question: str, session_id: str, timeout: float) -> dict[str, Any]:
+async def _post_flowise(
+    client: httpx.AsyncClient,
+    api_url: str,
+    question: str,
+    session_id: str,
+) -> dict[str, Any]:
     """Отправляет запрос в Flowise API."""
-    payload = {
+    payload = orjson.dumps({
         "question": question,
         "overrideConfig": {"sessionId": session_id},
-    }
+    })
 
     try:
-        resp = requests.post(api_url, json=payload, timeout=timeout)
-        data = resp.json()
+        resp = await client.post(
+            api_url, content=payload, headers={"Content-Type": "application/json"}
+        )
+        data = orjson.loads(resp.content)
     except Exception as e:
         logger.error("Ошибка запроса Flowise: %s", e)
         return {"status_code": 0, "response": {"error": str(e)}}
@@ -306,20 +342,77 @@ def _post_flowise(api_url: str, question: str, session_id: str, timeout: float)
     return {"status_code": resp.status_code, "response": data}
 
 
-def _search_start(
+async def _run_batch(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    api_url: str,
+    batch_num: int,
+    batch_pages: list[int],
+    prompt: str,
+    session_id: str,
+) -> tuple[BatchDebugInfo, dict[str, Any], dict | None]:
+    """Отправляет один батч (с ограничением параллельности) и разбирает ответ.
+
+    Returns:
+        (отладка батча, результат запроса, распарсенный JSON или None)
+    """
+    # Часы event loop (монотонные) — уже используются им для таймеров
+    loop_time = asyncio.get_running_loop().time
+    async with semaphore:
+        t0 = loop_time()
+        result = await _post_flowise(client, api_url, prompt, session_id)
+        elapsed = loop_time() - t0
+
+    response = result.get("response", {})
+    parsed = _extract_json_response(response)
+
+    batch_debug = BatchDebugInfo(
+        batch_num=batch_num,
+        pages=batch_pages,
+        elapsed_seconds=round(elapsed, 2),
+        http_status=result.get("status_code"),
+        parsed_response=parsed,
+        raw_response=response if FLOWISE_STORE_RAW_RESPONSE else None,
+    )
+    return batch_debug, result, parsed
+
+
+def _check_batch_result(batch_num: int, result: dict[str, Any], parsed: dict | None) -> bool:
+    """Логирует ошибки батча. Возвращает True, если ответ можно использовать."""
+    if result.get("status_code", 0) >= 400:
+        logger.error("HTTP ошибка %s", result.get("status_code"))
+        logger.error("Ответ сервера: %s", result.get("response", {}))
+        return False
+
+    if not parsed:
+        logger.warning("Не удалось распарсить ответ батча %s", batch_num)
+        return False
+
+    return True
+
+
+async def _search_start(
+    client: httpx.AsyncClient,
     all_pages: list[PageData],
     batch_size: int,
-    max_chars: int,
-    timeout: float,
+    run_ts: str,
 ) -> tuple[int | None, list[BatchDebugInfo]]:
-    """Фаза 1: Поиск начала списка дефектов."""
+    """Фаза 1: Поиск начала списка дефектов.
+
+    Батчи независимы, поэтому отправляются параллельно (не больше
+    FLOWISE_SEARCH_CONCURRENCY одновременно); ответы разбираются в порядке
+    батчей — побеждает первый батч с найденным началом, как и при
+    последовательном обходе. Как только он определён, запросы по
+    последующим батчам отменяются.
+    """
     logger.info("=" * 60)
     logger.info("ФАЗА 1: ПОИСК НАЧАЛА СПИСКА ДЕФЕКТОВ")
     logger.info("=" * 60)
 
     debug_info: list[BatchDebugInfo] = []
-    run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    semaphore = asyncio.Semaphore(FLOWISE_SEARCH_CONCURRENCY)
 
+    requests_args = []
     for i in range(0, len(all_pages), batch_size):
         batch = all_pages[i : i + batch_size]
         batch_num = i // batch_size + 1
@@ -327,134 +420,141 @@ def _search_start(
 
         logger.info("Батч %s: страницы %s", batch_num, batch_pages)
 
-        pages_content = _format_pages_for_prompt(batch, max_chars)
+        pages_content = _format_pages_for_prompt(batch)
         full_prompt = PROMPT_SEARCH_START.format(pages_content=pages_content)
 
         session_id = f"search_start_{run_ts}_batch_{batch_num}"
+        requests_args.append((batch_num, batch_pages, full_prompt, session_id))
 
-        t0 = time.perf_counter()
-        result = _post_flowise(FLOWISE_API_URL_SEARCH_START, full_prompt, session_id, timeout)
-        elapsed = time.perf_counter() - t0
-
-        response = result.get("response", {})
-        parsed = _extract_json_response(response)
-
-        batch_debug = BatchDebugInfo(
-            batch_num=batch_num,
-            pages=batch_pages,
-            elapsed_seconds=round(elapsed, 2),
-            http_status=result.get("status_code"),
-            parsed_response=parsed,
-            raw_response=response,
+    tasks = [
+        asyncio.create_task(
+            _run_batch(client, semaphore, FLOWISE_API_URL_SEARCH_START, *args)
         )
-        debug_info.append(batch_debug)
-
-        if result.get("status_code", 0) >= 400:
-            logger.error("HTTP ошибка %s", result.get("status_code"))
-            logger.error("Ответ сервера: %s", response)
-            continue
-
-        if not parsed:
-            logger.warning("Не удалось распарсить ответ батча %s", batch_num)
-            continue
+        for args in requests_args
+    ]
 
-        found = parsed.get("found", False)
-        start_page = parsed.get("start_page")
-        reason = parsed.get("reason", "")
-
-        logger.info("  found=%s, start_page=%s", found, start_page)
-        logger.info("  reason: %s...", reason[:100] if reason else "")
-
-        # start_page = -1 означает "не найдено"
-        if found and start_page is not None and int(start_page) > 0:
-            logger.info(">>> НАЙДЕНО НАЧАЛО на странице %s", start_page)
-            return int(start_page), debug_info
+    # Готовые ответы буферизуются по индексу батча и разбираются готовым
+    # префиксом: побеждает самый ранний батч, остальные запросы отменяются
+    ready: dict[int, tuple[BatchDebugInfo, dict[str, Any], dict | None]] = {}
+    next_idx = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            batch_debug, result, parsed = await next_done
+            ready[batch_debug.batch_num - 1] = (batch_debug, result, parsed)
+
+            while next_idx in ready:
+                batch_debug, result, parsed = ready.pop(next_idx)
+                next_idx += 1
+                batch_num = batch_debug.batch_num
+                debug_info.append(batch_debug)
+
+                if not _check_batch_result(batch_num, result, parsed):
+                    continue
+
+                found = parsed.get("found", False)
+                start_page = parsed.get("start_page")
+                reason = parsed.get("reason", "")
+
+                logger.info("Батч %s: found=%s, start_page=%s", batch_num, found, start_page)
+                logger.info("  reason: %s...", reason[:100] if reason else "")
+
+                # start_page = -1 означает "не найдено"
+                if found and start_page is not None and int(start_page) > 0:
+                    logger.info(">>> НАЙДЕНО НАЧАЛО на странице %s", start_page)
+                    return int(start_page), debug_info
+    finally:
+        for task in tasks:
+            task.cancel()
 
     logger.warning("Начало списка дефектов НЕ НАЙДЕНО")
     return None, debug_info
 
 
-def _search_end(
-    all_pages: list[PageData],
+async def _search_end(
+    client: httpx.AsyncClient,
+    pages_from_start: list[PageData],
     start_page: int,
     start_page_text: str,
     batch_size: int,
-    max_chars: int,
-    timeout: float,
+    run_ts: str,
 ) -> tuple[int | None, list[BatchDebugInfo]]:
-    """Фаза 2: Поиск конца списка дефектов."""
+    """Фаза 2: Поиск конца списка дефектов.
+
+    Ответы обрабатываются строго по порядку батчей (конец списка зависит
+    от предыдущих батчей), но запросы к следующим FLOWISE_SEARCH_END_LOOKAHEAD
+    батчам отправляются заранее. После найденного конца лишние запросы
+    отменяются.
+    """
     logger.info("=" * 60)
     logger.info("ФАЗА 2: ПОИСК КОНЦА (начиная со страницы %s)", start_page)
     logger.info("=" * 60)
 
     debug_info: list[BatchDebugInfo] = []
-    run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    semaphore = asyncio.Semaphore(FLOWISE_SEARCH_CONCURRENCY)
 
-    # Фильтруем страницы начиная с start_page
-    pages_from_start = [p for p in all_pages if p.page_number >= start_page]
+    # Контекст стартовой страницы (сокращённый) — общий для всех батчей
+    start_context = start_page_text[:10000].replace("\n", " ")
 
-    last_known_defect_page = start_page
-
-    for i in range(0, len(pages_from_start), batch_size):
+    def schedule(i: int) -> asyncio.Task:
         batch = pages_from_start[i : i + batch_size]
         batch_num = i // batch_size + 1
         batch_pages = [p.page_number for p in batch]
 
-        logger.info("Батч %s: страницы %s", batch_num, batch_pages)
-
-        pages_content = _format_pages_for_prompt(batch, max_chars)
-
-        # Контекст стартовой страницы (сокращённый)
-        start_context = start_page_text[:10000].replace("\n", " ")
-
+        pages_content = _format_pages_for_prompt(batch)
         full_prompt = PROMPT_SEARCH_END.format(
             start_page=start_page,
             start_page_text=start_context,
             pages_content=pages_content,
         )
-
         session_id = f"search_end_{run_ts}_batch_{batch_num}"
 
-        t0 = time.perf_counter()
-        result = _post_flowise(FLOWISE_API_URL_SEARCH_END, full_prompt, session_id, timeout)
-        elapsed = time.perf_counter() - t0
-
-        response = result.get("response", {})
-        parsed = _extract_json_response(response)
-
-        batch_debug = BatchDebugInfo(
-            batch_num=batch_num,
-            pages=batch_pages,
-            elapsed_seconds=round(elapsed, 2),
-            http_status=result.get("status_code"),
-            parsed_response=parsed,
-            raw_response=response,
-        )
-        debug_info.append(batch_debug)
-
-        if result.get("status_code", 0) >= 400:
-            logger.error("HTTP ошибка %s", result.get("status_code"))
-            logger.error("Ответ сервера: %s", response)
-            continue
+        return asyncio.create_task(_run_batch(
+            client, semaphore, FLOWISE_API_URL_SEARCH_END,
+            batch_num, batch_pages, full_prompt, session_id,
+        ))
 
-        if not parsed:
-            logger.warning("Не удалось распарсить ответ батча %s", batch_num)
-            continue
-
-        last_defect_page = parsed.get("last_defect_page")
-        definitely_ended = parsed.get("definitely_ended", False)
-        reason = parsed.get("reason", "")
-
-        logger.info("  last_defect_page=%s, definitely_ended=%s", last_defect_page, definitely_ended)
-        logger.info("  reason: %s...", reason[:100] if reason else "")
-
-        # last_defect_page = -1 означает "нет дефектов в батче"
-        if last_defect_page is not None and int(last_defect_page) > 0:
-            last_known_defect_page = int(last_defect_page)
+    batch_starts = range(0, len(pages_from_start), batch_size)
+    pending: dict[int, asyncio.Task] = {}
+    last_known_defect_page = start_page
 
-        if definitely_ended:
-            logger.info(">>> НАЙДЕН КОНЕЦ: последняя страница с дефектами = %s", last_known_defect_page)
-            return last_known_defect_page, debug_info
+    try:
+        for idx, i in enumerate(batch_starts):
+            # Держим в работе текущий батч и следующие за ним (окно упреждения)
+            for j in batch_starts[idx : idx + FLOWISE_SEARCH_END_LOOKAHEAD]:
+                if j not in pending:
+                    pending[j] = schedule(j)
+
+            batch_num = i // batch_size + 1
+            logger.info(
+                "Батч %s: страницы %s",
+                batch_num,
+                [p.page_number for p in pages_from_start[i : i + batch_size]],
+            )
+
+            batch_debug, result, parsed = await pending.pop(i)
+            debug_info.append(batch_debug)
+
+            if not _check_batch_result(batch_num, result, parsed):
+                continue
+
+            last_defect_page = parsed.get("last_defect_page")
+            definitely_ended = parsed.get("definitely_ended", False)
+            reason = parsed.get("reason", "")
+
+            logger.info("  last_defect_page=%s, definitely_ended=%s", last_defect_page, definitely_ended)
+            logger.info("  reason: %s...", reason[:100] if reason else "")
+
+            # last_defect_page = -1 означает "нет дефектов в батче"
+            if last_defect_page is not None and int(last_defect_page) > 0:
+                last_known_defect_page = int(last_defect_page)
+
+            if definitely_ended:
+                logger.info(">>> НАЙДЕН КОНЕЦ: последняя страница с дефектами = %s", last_known_defect_page)
+                return last_known_defect_page, debug_info
+    finally:
+        # Упреждающие запросы после найденного конца (или при ошибке) не нужны
+        for task in pending.values():
+            task.cancel()
 
     # Если дошли до конца документа без явного STOP
     logger.info("Документ закончился. Последняя страница с дефектами: %s", last_known_defect_page)
@@ -465,7 +565,7 @@ def _search_end(
 # Публичный API
 # -----------------------------
 
-def filter_relevant_pages(
+async def filter_relevant_pages(
     txt_path: str | Path,
     *,
     max_pages: int | None = None,
@@ -497,43 +597,59 @@ def filter_relevant_pages(
     logger.info("API START: %s", FLOWISE_API_URL_SEARCH_START)
     logger.info("API END: %s", FLOWISE_API_URL_SEARCH_END)
 
-    all_pages = _parse_ocr_txt_file(txt_file)
+    all_pages = await asyncio.to_thread(_parse_ocr_txt_file, txt_file, _max_chars)
+
+    # Страницы в файле идут по возрастанию (сортировка уже упорядоченного
+    # списка — один линейный проход); дальше границы ищутся бинарным поиском
+    all_pages.sort(key=_page_number)
 
     # Применяем лимит страниц
     if max_pages and max_pages > 0:
-        all_pages = [p for p in all_pages if p.page_number <= max_pages]
+        all_pages = all_pages[: bisect.bisect_right(all_pages, max_pages, key=_page_number)]
 
     if not all_pages:
         raise ValueError("Не найдено страниц в OCR файле")
 
-    # Словарь для быстрого доступа к тексту
-    page_dict = {p.page_number: p.text for p in all_pages}
-
     started_at = time.perf_counter()
+    # Общая метка запуска для sessionId обеих фаз
+    run_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    # === ФАЗА 1: ПОИСК НАЧАЛА ===
-    start_page, start_debug = _search_start(all_pages, _batch_size, _max_chars, _timeout)
-
-    if start_page is None:
-        # Не нашли начало — нет релевантных страниц
-        return PageFilterResult(
-            txt_path=txt_file,
-            total_pages=len(all_pages),
-            relevant_pages=[],
-            relevant_count=0,
-            start_page=None,
-            end_page=None,
-            fsm_final_state="NO_DEFECTS_FOUND",
-            elapsed_seconds=round(time.perf_counter() - started_at, 2),
-            debug_search_start=[d.model_dump() for d in start_debug],  # type: ignore[misc]
-            debug_search_end=[],
-        )
-
-    # === ФАЗА 2: ПОИСК КОНЦА ===
-    start_page_text = page_dict.get(start_page, "")
-    end_page, end_debug = _search_end(
-        all_pages, start_page, start_page_text, _batch_size, _max_chars, _timeout
+    # Один HTTP клиент на весь запуск: соединения переиспользуются между батчами.
+    # Пул по числу одновременных запросов — каждый держит своё keep-alive соединение
+    _limits = httpx.Limits(
+        max_connections=FLOWISE_SEARCH_CONCURRENCY,
+        max_keepalive_connections=FLOWISE_SEARCH_CONCURRENCY,
     )
+    async with httpx.AsyncClient(timeout=_timeout, limits=_limits) as client:
+        # === ФАЗА 1: ПОИСК НАЧАЛА ===
+        start_page, start_debug = await _search_start(client, all_pages, _batch_size, run_ts)
+
+        if start_page is None:
+            # Не нашли начало — нет релевантных страниц
+            return PageFilterResult(
+                txt_path=txt_file,
+                total_pages=len(all_pages),
+                relevant_pages=[],
+                relevant_count=0,
+                start_page=None,
+                end_page=None,
+                fsm_final_state="NO_DEFECTS_FOUND",
+                elapsed_seconds=round(time.perf_counter() - started_at, 2),
+                debug_search_start=start_debug,
+                debug_search_end=[],
+            )
+
+        # === ФАЗА 2: ПОИСК КОНЦА ===
+        start_idx = bisect.bisect_left(all_pages, start_page, key=_page_number)
+        pages_from_start = all_pages[start_idx:]
+        start_page_text = (
+            pages_from_start[0].text
+            if pages_from_start and pages_from_start[0].page_number == start_page
+            else ""
+        )
+        end_page, end_debug = await _search_end(
+            client, pages_from_start, start_page, start_page_text, _batch_size, run_ts
+        )
 
     # Формируем список релевантных страниц
     relevant_pages = list(range(start_page, (end_page or start_page) + 1))
@@ -547,17 +663,22 @@ def filter_relevant_pages(
         end_page=end_page,
         fsm_final_state="FINISHED",
         elapsed_seconds=round(time.perf_counter() - started_at, 2),
-        debug_search_start=[d.model_dump() for d in start_debug],  # type: ignore[misc]
-        debug_search_end=[d.model_dump() for d in end_debug],  # type: ignore[misc]
+        debug_search_start=start_debug,
+        debug_search_end=end_debug,
     )
 
 
-def save_filter_result(result: PageFilterResult, *, result_dir: str | Path) -> Path:
+def save_filter_result(
+    result: PageFilterResult, *, result_dir: str | Path, pretty: bool = False
+) -> Path:
     """Сохраняет результат фильтрации в JSON.
 
+    Пустые (None) и дефолтные поля не пишутся — в debug_search_* их много.
+
     Args:
         result: результат фильтрации
         result_dir: директория для сохранения
+        pretty: человекочитаемый JSON с отступами (по умолчанию — компактный)
 
     Returns:
         Путь к сохранённому JSON файлу.
@@ -569,13 +690,9 @@ def save_filter_result(result: PageFilterResult, *, result_dir: str | Path) -> P
     stem = result.txt_path.stem
     out_path = out_dir / f"page_filter_{stem}_{run_ts}.json"
 
-    # Сериализация в JSON
-    if hasattr(result, "model_dump_json"):
-        json_text = result.model_dump_json(indent=2)
-    else:
-        json_text = result.json(indent=2, ensure_ascii=False)
-
-    out_path.write_text(json_text, encoding="utf-8")
+    # Сериализация через orjson сразу в bytes
+    data = result.model_dump(mode="json", exclude_none=True, exclude_defaults=True)
+    out_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0))
     logger.info("Результат фильтрации сохранён: %s", out_path)
 
     return out_path
@@ -11,26 +11,45 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import os
 import shutil
 import subprocess
+import threading
 import time
-from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from functools import lru_cache
 from pathlib import Path
 from typing import Literal
 
+import orjson
+from PIL import Image
 from pydantic import BaseModel, Field
 
 from config import (
     logger,
     OCR_KEEP_PREPROCESS_WORKDIR,
     OCR_PAGE_CONCURRENCY,
+    OCR_TESSERACT_BATCH_PAGES,
     TESSERACT_LANG,
     TESSERACT_OEM,
     TESSERACT_PSM,
     TESSERACT_PRESERVE_INTERWORD_SPACES,
     TESSERACT_PAGE_TIMEOUT_SECONDS,
 )
-from services.pdf_preprocessor import PreprocessedPage, preprocess_pdf_to_images
+from services.pdf_preprocessor import (
+    PreprocessedPage,
+    create_preprocess_workdir,
+    iter_preprocessed_pages,
+)
+
+# tesserocr — libtesseract в процессе (без запуска tesseract на каждую пачку).
+# Опционально: нужна системная libtesseract; без неё используется CLI tesseract
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
 
 
 # -----------------------------
@@ -65,10 +84,9 @@ class DocumentData(BaseModel):
 
     def get_all_text(self) -> str:
         """Склеивает документ в удобный .txt формат (как артефакт для отладки/поиска)."""
-        chunks: list[str] = []
-        for page in self.pages:
-            chunks.append(f"=== Страница {page.page_number} ===\n{page.full_text}".rstrip())
-        return "\n\n".join(chunks).rstrip() + "\n"
+        return "\n\n".join(
+            f"=== Страница {page.page_number} ===\n{page.full_text}".rstrip() for page in self.pages
+        ).rstrip() + "\n"
 
 
 class OCRResult(BaseModel):
@@ -93,17 +111,70 @@ def _ensure_pdf_file(pdf_path: str | Path) -> Path:
     return pdf
 
 
+@lru_cache(maxsize=1)
+def _tesseract_bin() -> str | None:
+    """Абсолютный путь к бинарю `tesseract` (поиск в PATH — один раз на процесс)."""
+    return shutil.which("tesseract")
+
+
+@lru_cache(maxsize=1)
+def _warm_tessdata() -> None:
+    """Прочитывает языковые модели tesseract один раз, чтобы они легли в page cache ОС.
+
+    Каждый запуск CLI tesseract загружает `<lang>.traineddata` заново; после
+    прогрева это чтение из памяти, а не с диска. Работает, если задан
+    TESSDATA_PREFIX (иначе путь к tessdata зависит от сборки tesseract).
+    """
+    prefix = os.environ.get("TESSDATA_PREFIX")
+    if not prefix:
+        return
+    for lang in str(TESSERACT_LANG).split("+"):
+        path = Path(prefix) / f"{lang}.traineddata"
+        try:
+            with path.open("rb") as f:
+                while f.read(1 << 20):
+                    pass
+        except OSError:
+            logger.debug("OCR: не удалось прогреть tessdata: %s", path)
+
+
 def _ensure_tesseract_available() -> None:
-    """Проверяет, что бинарь `tesseract` доступен в PATH."""
-    if not shutil.which("tesseract"):
+    """Проверяет, что бинарь `tesseract` доступен в PATH (не нужен при tesserocr)."""
+    if TESSEROCR_AVAILABLE:
+        return
+    if not _tesseract_bin():
         raise RuntimeError("Не найден бинарь `tesseract` в PATH. Установите tesseract-ocr и добавьте в PATH.")
 
 
-def _tesseract_ocr_image(*, image_path: Path) -> str:
-    """Запускает tesseract для одного изображения страницы и возвращает распознанный текст."""
+# Разделитель страниц в выводе tesseract (text renderer, page_separator по умолчанию)
+_TESSERACT_PAGE_SEPARATOR = "\x0c"
+
+
+# Параллелизм — по страницам (пул воркеров), поэтому сам tesseract работает
+# в один поток OpenMP и не конкурирует с соседними процессами за ядра.
+# Явно заданный в окружении OMP_THREAD_LIMIT имеет приоритет
+_TESSERACT_ENV = {"OMP_THREAD_LIMIT": "1", **os.environ}
+
+
+def _tesseract_ocr_images(*, image_paths: list[Path], list_path: Path) -> list[str]:
+    """Распознаёт несколько страниц одним запуском tesseract.
+
+    Пути изображений пишутся в list-файл, tesseract получает его как вход и
+    выводит тексты страниц подряд, разделяя их form feed. Запуск процесса и
+    загрузка языковых моделей оплачиваются один раз на пачку, а не на страницу.
+
+    Args:
+        image_paths: изображения страниц (в порядке документа)
+        list_path: куда записать list-файл для tesseract
+
+    Returns:
+        Тексты страниц в том же порядке, что и `image_paths`.
+    """
+    list_path.write_text("".join(f"{path}\n" for path in image_paths), encoding="utf-8")
+
     cmd = [
-        "tesseract",
-        str(image_path),
+        _tesseract_bin() or "tesseract",
+        str(list_path),
         "stdout",
         "-l",
         str(TESSERACT_LANG),
@@ -114,53 +185,143 @@ def _tesseract_ocr_image(*, image_path: Path) -> str:
         "-c",
         f"preserve_interword_spaces={int(TESSERACT_PRESERVE_INTERWORD_SPACES)}",
     ]
+    # Таймаут масштабируется на число страниц в пачке
+    timeout = float(TESSERACT_PAGE_TIMEOUT_SECONDS) * len(image_paths)
 
     try:
         completed = subprocess.run(
             cmd,
             capture_output=True,
             check=False,
-            timeout=float(TESSERACT_PAGE_TIMEOUT_SECONDS),
+            timeout=timeout,
+            env=_TESSERACT_ENV,
             text=True,
             encoding="utf-8",
             errors="replace",
         )
     except subprocess.TimeoutExpired as e:
         raise TimeoutError(
-            f"Tesseract timeout after {TESSERACT_PAGE_TIMEOUT_SECONDS}s: {image_path.name}"
+            f"Tesseract timeout after {timeout:.0f}s: {image_paths[0].name}..{image_paths[-1].name}"
         ) from e
 
     if completed.returncode != 0:
         stderr = (completed.stderr or "").strip()
         raise RuntimeError(f"Tesseract завершился с ошибкой (code={completed.returncode}): {stderr}")
 
-    return completed.stdout or ""
+    # Разделитель идёт после каждой страницы, последний кусок — пустой хвост
+    texts = (completed.stdout or "").split(_TESSERACT_PAGE_SEPARATOR)
+    if len(texts) == len(image_paths) + 1 and not texts[-1].strip():
+        texts.pop()
+    if len(texts) != len(image_paths):
+        raise RuntimeError(
+            f"Tesseract вернул {len(texts)} страниц вместо {len(image_paths)}: {list_path.name}"
+        )
+    return texts
+
+
+# Экземпляр PyTessBaseAPI на поток пула OCR: API не потокобезопасен,
+# а языковые модели загружаются один раз на поток, а не на страницу
+_tess_local = threading.local()
+
+
+def _get_tess_api() -> "tesserocr.PyTessBaseAPI":
+    api = getattr(_tess_local, "api", None)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(
+            lang=str(TESSERACT_LANG),
+            oem=int(TESSERACT_OEM),
+            psm=int(TESSERACT_PSM),
+        )
+        api.SetVariable(
+            "preserve_interword_spaces", str(int(TESSERACT_PRESERVE_INTERWORD_SPACES))
+        )
+        _tess_local.api = api
+    return api
+
+
+def _tesserocr_ocr_pages(*, pages: list[PreprocessedPage]) -> list[str]:
+    """Распознаёт страницы через libtesseract (tesserocr) в текущем потоке.
+
+    Изображение из памяти (режим in_memory предпроцессинга) передаётся
+    напрямую и освобождается сразу после распознавания; иначе читается файл.
+
+    Args:
+        pages: страницы после предпроцессинга (в порядке документа)
+
+    Returns:
+        Тексты страниц в том же порядке, что и `pages`.
+    """
+    api = _get_tess_api()
+    texts: list[str] = []
+    for page in pages:
+        if page.image is not None:
+            api.SetImage(Image.fromarray(page.image))
+            page.image = None
+        else:
+            api.SetImageFile(str(page.preprocessed_path))
+        texts.append(api.GetUTF8Text())
+    return texts
+
+
+def _timed_ocr(ocr_func, /, **kwargs) -> tuple[float, list[str]]:
+    """Запускает OCR пачки в потоке пула и замеряет время уже в воркере.
+
+    Время ожидания в очереди пула не попадает в статистику секунд на страницу.
+
+    Returns:
+        (секунды распознавания пачки, тексты страниц)
+    """
+    started_at = time.perf_counter()
+    texts = ocr_func(**kwargs)
+    return time.perf_counter() - started_at, texts
 
 
 def _normalize_ocr_text(text: str) -> str:
     # Не используем strip(): ведущие пробелы могут быть полезны для таблиц/формата.
-    return (text or "").replace("\r\n", "\n").rstrip()
+    # tesseract на Linux \r не выдаёт — лишнюю копию страницы не делаем
+    text = text or ""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    return text.rstrip()
+
+
+def _available_cpus() -> int:
+    """Сколько CPU реально доступно процессу (affinity/cpuset контейнера)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS/Windows: affinity недоступна
+        return os.cpu_count() or 1
 
 
 def _normalize_concurrency(concurrency: int | None) -> int:
+    """Число параллельных OCR воркеров: <=0 — по числу CPU, иначе не больше числа CPU.
+
+    Больше воркеров, чем ядер, только мешает: tesseract-процессы начинают
+    делить ядра между собой.
+    """
     if concurrency is None:
         value = int(OCR_PAGE_CONCURRENCY)
     else:
         value = int(concurrency)
-    return value if value > 0 else 1
+    cpus = _available_cpus()
+    return min(value, cpus) if value > 0 else cpus
 
 
 def _build_document_from_page_texts(filename: str, page_texts: list[str]) -> DocumentData:
-    """Собирает `DocumentData` из списка строк по страницам."""
+    """Собирает `DocumentData` из списка строк по страницам.
+
+    Данные формируются здесь же и заведомо корректны, поэтому модели
+    собираются через model_construct (без pydantic-валидации на каждую страницу).
+    """
     pages: list[PageData] = []
     for page_number, text in enumerate(page_texts, start=1):
         normalized = _normalize_ocr_text(text)
         elements: list[TextElement] = []
         if normalized:
-            elements.append(TextElement(category="ocr", content=normalized, type="text"))
+            elements.append(TextElement.model_construct(category="ocr", content=normalized, type="text"))
 
         pages.append(
-            PageData(
+            PageData.model_construct(
                 page_number=page_number,
                 full_text=normalized,
                 elements=elements,
@@ -168,12 +329,18 @@ def _build_document_from_page_texts(filename: str, page_texts: list[str]) -> Doc
             )
         )
 
-    return DocumentData(filename=filename, pages=pages, total_pages=len(pages))
+    return DocumentData.model_construct(filename=filename, pages=pages, total_pages=len(pages))
 
 
 def _ocr_pdf_sync(pdf_path: str | Path, *, max_pages: int | None, concurrency: int | None) -> OCRResult:
-    """Синхронная реализация OCR: PDF -> preprocess -> tesseract per page."""
+    """Синхронная реализация OCR: PDF -> preprocess -> tesseract по пачкам страниц.
+
+    Предпроцессинг и OCR идут конвейером: пачка страниц отправляется в пул
+    сразу после рендера, пока следующие страницы ещё рендерятся.
+    """
     _ensure_tesseract_available()
+    if not TESSEROCR_AVAILABLE:
+        _warm_tessdata()
 
     started_at = time.perf_counter()
     pdf = _ensure_pdf_file(pdf_path)
@@ -188,48 +355,137 @@ def _ocr_pdf_sync(pdf_path: str | Path, *, max_pages: int | None, concurrency: i
         TESSERACT_PRESERVE_INTERWORD_SPACES,
         TESSERACT_PAGE_TIMEOUT_SECONDS,
     )
-    logger.info("OCR параллельность: page_concurrency=%s", max_workers)
-
-    preprocessed = preprocess_pdf_to_images(pdf, max_pages=max_pages)
-    logger.info("OCR: предпроцессинг готов, pages=%s, workdir=%s", len(preprocessed.pages), preprocessed.workdir)
+    logger.info(
+        "OCR параллельность: page_concurrency=%s, engine=%s",
+        max_workers,
+        "tesserocr" if TESSEROCR_AVAILABLE else "tesseract-cli",
+    )
 
-    total_pages = len(preprocessed.pages)
     keep_workdir = bool(OCR_KEEP_PREPROCESS_WORKDIR)
+    # tesserocr принимает изображения из памяти — файлы страниц нужны только
+    # CLI tesseract или для отладки (сохранённый workdir)
+    in_memory = TESSEROCR_AVAILABLE and not keep_workdir
+    workdir = create_preprocess_workdir()
+
+    # Пачка — одна задача пула: процесс tesseract на несколько страниц (CLI)
+    # или одна страница (tesserocr, запуск процесса не нужен)
+    batch_pages = max(int(OCR_TESSERACT_BATCH_PAGES), 1)
+
+    def chunk_size_for(page: PreprocessedPage) -> int:
+        """Размер пачки, начинающейся с `page`.
+
+        Не больше OCR_TESSERACT_BATCH_PAGES и не больше оставшихся страниц / числа
+        воркеров: на коротких документах и в хвосте длинных страницы делятся
+        между всеми воркерами, а не уходят в одну-две пачки.
+        """
+        if TESSEROCR_AVAILABLE:
+            return 1
+        if page.page_count is None:
+            return batch_pages
+        remaining = int(page.page_count) - int(page.page_number) + 1
+        return max(min(batch_pages, -(-remaining // max_workers)), 1)
+
+    # Рендер идёт впереди OCR не больше чем на одну пачку сверх занятых потоков
+    max_pending = max_workers + 1
 
     try:
         texts_by_page: dict[int, str] = {}
-        future_meta: dict[Future[str], tuple[PreprocessedPage, float]] = {}
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for page in preprocessed.pages:
-                logger.info(
-                    "OCR старт страницы %s/%s: preprocessed=%s",
-                    page.page_number,
-                    total_pages,
-                    page.preprocessed_path.name,
-                )
-                future = executor.submit(_tesseract_ocr_image, image_path=page.preprocessed_path)
-                future_meta[future] = (page, time.perf_counter())
-
-            for future in as_completed(future_meta):
-                page, submitted_at = future_meta[future]
-                page_number = page.page_number
-                page_name = page.preprocessed_path.name
+        pending: dict[Future[tuple[float, list[str]]], list[PreprocessedPage]] = {}
+        # Секунды на страницу (время распознавания пачки / её размер) — для итоговой статистики
+        page_seconds: list[float] = []
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        def release_files(page: PreprocessedPage) -> None:
+            # Файлы обработанных страниц больше не нужны: на диске остаются
+            # только страницы пачек в работе, а не весь PDF
+            if keep_workdir:
+                return
+            for path in (page.rendered_path, page.preprocessed_path):
+                if path is not None:
+                    path.unlink(missing_ok=True)
+
+        def collect(futures) -> None:
+            for future in futures:
+                chunk = pending.pop(future)
+                first_page = chunk[0].page_number
+                last_page = chunk[-1].page_number
                 try:
-                    text = future.result()
+                    seconds, texts = future.result()
                 except Exception as e:
-                    raise RuntimeError(f"OCR ошибка на странице {page_number}/{total_pages}: {page_name}") from e
-
-                texts_by_page[int(page_number)] = text
-                logger.info(
-                    "OCR страница %s/%s готова: chars=%s, seconds=%.2f",
-                    page_number,
-                    total_pages,
-                    len(text),
-                    time.perf_counter() - float(submitted_at),
-                )
+                    raise RuntimeError(f"OCR ошибка на страницах {first_page}-{last_page}") from e
+
+                for page, text in zip(chunk, texts):
+                    texts_by_page[int(page.page_number)] = text
+                for page in chunk:
+                    release_files(page)
+                page_seconds.extend([seconds / len(chunk)] * len(chunk))
+                if debug:
+                    logger.debug(
+                        "OCR страницы %s-%s готовы: chars=%s, seconds=%.2f",
+                        first_page,
+                        last_page,
+                        sum(map(len, texts)),
+                        seconds,
+                    )
+
+        # Конвейер: страницы уходят в OCR по мере рендера, а не после рендера всего PDF
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
 
-        page_texts = [texts_by_page[i] for i in range(1, total_pages + 1)]
+            def submit(chunk: list[PreprocessedPage]) -> None:
+                if debug:
+                    logger.debug("OCR старт: страницы %s-%s", chunk[0].page_number, chunk[-1].page_number)
+                if TESSEROCR_AVAILABLE:
+                    future = executor.submit(_timed_ocr, _tesserocr_ocr_pages, pages=chunk)
+                else:
+                    future = executor.submit(
+                        _timed_ocr,
+                        _tesseract_ocr_images,
+                        image_paths=[page.preprocessed_path for page in chunk],
+                        list_path=workdir / f"ocr_list_{chunk[0].page_number:04d}.txt",
+                    )
+                pending[future] = chunk
+
+                # Ограничиваем число пачек в работе (и страниц в памяти)
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            chunk: list[PreprocessedPage] = []
+            chunk_size = 0
+            blank_pages = 0
+            for page in iter_preprocessed_pages(
+                pdf, workdir=workdir, max_pages=max_pages, in_memory=in_memory
+            ):
+                # Пустая страница: текст заведомо пустой, tesseract не запускаем
+                if page.is_blank:
+                    texts_by_page[int(page.page_number)] = ""
+                    blank_pages += 1
+                    release_files(page)
+                    continue
+                if not chunk:
+                    chunk_size = chunk_size_for(page)
+                chunk.append(page)
+                if len(chunk) >= chunk_size:
+                    submit(chunk)
+                    chunk = []
+            if chunk:
+                submit(chunk)
+
+            collect(as_completed(list(pending)))
+
+        if blank_pages:
+            logger.info("OCR: пустые страницы пропущены без распознавания: %s", blank_pages)
+
+        page_texts = [texts_by_page[i] for i in sorted(texts_by_page)]
+        if page_seconds:
+            page_seconds.sort()
+            logger.info(
+                "OCR страницы: pages=%s, chars=%s, seconds/page p50=%.2f p99=%.2f",
+                len(page_texts),
+                sum(map(len, page_texts)),
+                page_seconds[len(page_seconds) // 2],
+                page_seconds[min(len(page_seconds) - 1, int(len(page_seconds) * 0.99))],
+            )
 
         document = _build_document_from_page_texts(pdf.name, page_texts)
         duration = time.perf_counter() - started_at
@@ -238,18 +494,18 @@ def _ocr_pdf_sync(pdf_path: str | Path, *, max_pages: int | None, concurrency: i
             pdf_path=pdf,
             seconds=duration,
             document=document,
-            preprocess_workdir=preprocessed.workdir,
+            preprocess_workdir=workdir,
             preprocess_workdir_kept=keep_workdir,
         )
     finally:
         if keep_workdir:
-            logger.info("OCR: workdir сохранён для отладки: %s", preprocessed.workdir)
+            logger.info("OCR: workdir сохранён для отладки: %s", workdir)
         else:
             try:
-                preprocessed.cleanup()
-                logger.info("OCR: workdir удалён: %s", preprocessed.workdir)
+                shutil.rmtree(workdir, ignore_errors=True)
+                logger.info("OCR: workdir удалён: %s", workdir)
             except Exception:
-                logger.warning("OCR: не удалось удалить workdir: %s", preprocessed.workdir, exc_info=True)
+                logger.warning("OCR: не удалось удалить workdir: %s", workdir, exc_info=True)
 
 
 # -----------------------------
@@ -271,11 +527,9 @@ async def process_pdf_ocr(
     return await asyncio.to_thread(_ocr_pdf_sync, pdf, max_pages=max_pages, concurrency=concurrency)
 
 
-def _document_to_json(document: DocumentData) -> str:
-    # Совместимость pydantic v1/v2, чтобы не зависеть от конкретной версии.
-    if hasattr(document, "model_dump_json"):
-        return document.model_dump_json(indent=2)  # type: ignore[attr-defined]
-    return document.json(indent=2, ensure_ascii=False)
+def _document_to_json(document: DocumentData) -> bytes:
+    # orjson пишет сразу UTF-8 bytes — без отдельного encode перед записью
+    return orjson.dumps(document.model_dump(mode="json"), option=orjson.OPT_INDENT_2)
 
 
 async def save_ocr_result(result: OCRResult, *, result_dir: str | Path) -> tuple[Path, Path]:
@@ -289,20 +543,22 @@ async def save_ocr_result(result: OCRResult, *, result_dir: str | Path) -> tuple
         (json_path, txt_path)
     """
     out_dir = Path(result_dir).expanduser().resolve()
-    out_dir.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(out_dir.mkdir, parents=True, exist_ok=True)
 
     stem = Path(result.document.filename).stem
     json_path = out_dir / f"ocr_result_{stem}.json"
     txt_path = out_dir / f"full_text_{stem}.txt"
 
-    json_text = _document_to_json(result.document)
-    txt_text = result.document.get_all_text()
+    # Сериализация тоже в потоках: на больших документах это мегабайты текста,
+    # event loop не должен их ждать
+    def _write_json() -> None:
+        json_path.write_bytes(_document_to_json(result.document))
 
-    def _write() -> None:
-        json_path.write_text(json_text, encoding="utf-8")
-        txt_path.write_text(txt_text, encoding="utf-8")
+    def _write_txt() -> None:
+        txt_path.write_bytes(result.document.get_all_text().encode("utf-8"))
 
     logger.info("OCR: сохраняю артефакты: json=%s, txt=%s", json_path.name, txt_path.name)
-    await asyncio.to_thread(_write)
+    # Два независимых файла пишутся параллельно
+    await asyncio.gather(asyncio.to_thread(_write_json), asyncio.to_thread(_write_txt))
     logger.info("OCR: артефакты сохранены: %s", out_dir)
     return json_path, txt_path
@@ -2,36 +2,65 @@
 
 Задача: подготовить страницы PDF в виде файлов изображений, пригодных для OCR.
 OCR здесь НЕ выполняется — только подготовка входа для OCR-движка.
+
+Рендер: PyMuPDF (fitz, в процессе, сразу grayscale), если установлен;
+иначе pdf2image + Poppler.
+
+Режим `in_memory=True`: страницы рендерятся сразу в grayscale и отдаются
+numpy-массивами, без записи rendered/preprocessed файлов на диск.
 """
 
 from __future__ import annotations
 
+import logging
 import shutil
 import tempfile
 import time
+from collections.abc import Iterator
 from pathlib import Path
+from typing import Any
 
 from pydantic import BaseModel, Field
 
 from config import (
     logger,
+    PDF_BLANK_PAGE_STD_THRESHOLD,
     PDF_PREPROCESS_NORMALIZE,
+    PDF_PREPROCESS_NORMALIZE_SKIP_RANGE,
     PDF_PREPROCESS_OUTPUT_FORMAT,
     PDF_RENDER_DPI,
-    PDF_RENDER_FORMAT,
+    PDF_RENDER_BATCH_PAGES,
     PDF_RENDER_THREAD_COUNT,
 )
 
+# PyMuPDF — рендер страниц в процессе, без pdftoppm и промежуточных файлов
+try:
+    import fitz
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
 
 class PreprocessedPage(BaseModel):
     """Артефакты одной страницы после предпроцессинга."""
 
     page_number: int = Field(..., description="Номер страницы (1..N) в исходном PDF.")
-    rendered_path: Path = Field(..., description="Путь к файлу страницы после рендера PDF→image.")
-    preprocessed_path: Path = Field(
-        ...,
+    page_count: int | None = Field(
+        None, description="Сколько всего страниц обрабатывается (с учётом max_pages)."
+    )
+    rendered_path: Path | None = Field(
+        None, description="Путь к файлу страницы после рендера PDF→image (None — рендер в память)."
+    )
+    preprocessed_path: Path | None = Field(
+        None,
         description="Путь к файлу страницы после предобработки (grayscale/normalize) для OCR.",
     )
+    image: Any = Field(
+        None,
+        exclude=True,
+        description="Предобработанное изображение (numpy uint8, grayscale) в режиме in_memory.",
+    )
+    is_blank: bool = Field(False, description="Пустая страница (без текста) — OCR можно пропустить.")
 
 
 class PreprocessedPDF(BaseModel):
@@ -96,13 +125,9 @@ def _import_cv2():
         raise RuntimeError("Нужен пакет `opencv-python` (и numpy) для предобработки изображений.") from e
 
 
-def _create_workdir(*, prefix: str = "fsk_pdf_preprocess_") -> tuple[Path, Path, Path]:
-    workdir = Path(tempfile.mkdtemp(prefix=prefix))
-    render_dir = workdir / "rendered"
-    preprocess_dir = workdir / "preprocessed"
-    render_dir.mkdir(parents=True, exist_ok=True)
-    preprocess_dir.mkdir(parents=True, exist_ok=True)
-    return workdir, render_dir, preprocess_dir
+def create_preprocess_workdir(*, prefix: str = "fsk_pdf_preprocess_") -> Path:
+    """Создаёт временную рабочую директорию предпроцессинга."""
+    return Path(tempfile.mkdtemp(prefix=prefix))
 
 
 def _preprocess_page_to_file(
@@ -113,14 +138,62 @@ def _preprocess_page_to_file(
     page_number: int,
     normalize: bool,
     output_ext: str,
-) -> Path:
+) -> tuple[Path, bool]:
     gray = cv2.imread(str(rendered_path), cv2.IMREAD_GRAYSCALE)
     if gray is None:
         raise RuntimeError(f"Не удалось загрузить изображение: {rendered_path}")
 
-    if normalize:
-        gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+    gray, is_blank = _prepare_gray(cv2, gray, normalize=normalize)
+
+    preprocessed_path = _save_preprocessed(
+        cv2=cv2, gray=gray, preprocess_dir=preprocess_dir, page_number=page_number, output_ext=output_ext
+    )
+    return preprocessed_path, is_blank
+
+
+def _is_blank_page(gray) -> bool:
+    """Пустая ли страница: почти однородная яркость (std по каждому 4-му пикселю).
+
+    Считается до нормализации: растяжка контраста превращает шум чистого
+    листа в полный диапазон 0..255.
+    """
+    threshold = float(PDF_BLANK_PAGE_STD_THRESHOLD)
+    if threshold <= 0:
+        return False
+    return float(gray[::4, ::4].std()) < threshold
+
+
+def _prepare_gray(cv2, gray, *, normalize: bool):
+    """Предобработка grayscale страницы: определение пустой страницы + normalize.
+
+    Returns:
+        (изображение после предобработки, пустая ли страница)
+    """
+    is_blank = _is_blank_page(gray)
+    if normalize and not is_blank:
+        gray = _normalize_gray(cv2, gray)
+    return gray, is_blank
+
+
+def _normalize_gray(cv2, gray):
+    """Растягивает контраст grayscale страницы на 0..255 (как NORM_MINMAX).
+
+    Хорошо экспонированные страницы (диапазон по выборке каждого 8-го пикселя
+    >= PDF_PREPROCESS_NORMALIZE_SKIP_RANGE) не трогаются — это лишний полный
+    проход по изображению. Остальные: minMaxLoc и один проход convertScaleAbs
+    (u8 -> u8 с масштабом); массив с правом записи нормализуется на месте.
+    """
+    sample = gray[::8, ::8]
+    if int(sample.max()) - int(sample.min()) >= int(PDF_PREPROCESS_NORMALIZE_SKIP_RANGE):
+        return gray
+
+    mn, mx, _, _ = cv2.minMaxLoc(gray)
+    alpha = 255.0 / max(mx - mn, 1.0)
+    dst = gray if gray.flags.writeable else None
+    return cv2.convertScaleAbs(gray, dst, alpha, -mn * alpha)
 
+
+def _save_preprocessed(*, cv2, gray, preprocess_dir: Path, page_number: int, output_ext: str) -> Path:
     preprocessed_path = preprocess_dir / f"page_{page_number:04d}.{output_ext}"
     ok = cv2.imwrite(str(preprocessed_path), gray)
     if not ok:
@@ -129,89 +202,221 @@ def _preprocess_page_to_file(
     return preprocessed_path
 
 
-def preprocess_pdf_to_images(pdf_path: str | Path, *, max_pages: int | None = None) -> PreprocessedPDF:
-    """Рендерит PDF в изображения и делает простую предобработку (grayscale + normalize).
+def _render_gray_pages_fitz(*, pdf: Path, last_page: int | None):
+    """Рендерит страницы через PyMuPDF сразу в grayscale numpy-массивы.
 
-    Важно:
-    - Настройки берутся ТОЛЬКО из `config.py`.
-    - `max_pages` — runtime-ограничение для тестов (не "настройка качества").
+    Документ MuPDF не потокобезопасен, поэтому страницы рендерятся
+    последовательно в одном потоке.
+
+    Yields:
+        (page_number, page_count, grayscale изображение)
+    """
+    import numpy as np
+
+    with fitz.open(str(pdf)) as doc:
+        page_count = doc.page_count if last_page is None else min(doc.page_count, last_page)
+        for page_number in range(1, page_count + 1):
+            pix = doc.load_page(page_number - 1).get_pixmap(
+                dpi=int(PDF_RENDER_DPI), colorspace=fitz.csGRAY, alpha=False
+            )
+            gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+            yield page_number, page_count, gray
+
+
+def _render_gray_pages_pdf2image(*, pdf: Path, last_page: int | None):
+    """Рендерит страницы через pdf2image сразу в grayscale numpy-массивы.
+
+    Рендер идёт блоками по PDF_RENDER_BATCH_PAGES страниц, чтобы не держать
+    в памяти весь документ.
+
+    Yields:
+        (page_number, page_count, grayscale изображение)
+    """
+    import numpy as np
+    from pdf2image import pdfinfo_from_path
+
+    convert_from_path = _import_convert_from_path()
+
+    page_count = int(pdfinfo_from_path(str(pdf))["Pages"])
+    if last_page is not None:
+        page_count = min(page_count, last_page)
+
+    block = max(int(PDF_RENDER_BATCH_PAGES), 1)
+
+    for first in range(1, page_count + 1, block):
+        images = convert_from_path(
+            str(pdf),
+            dpi=int(PDF_RENDER_DPI),
+            first_page=first,
+            last_page=min(first + block - 1, page_count),
+            fmt="ppm",
+            grayscale=True,
+            thread_count=int(PDF_RENDER_THREAD_COUNT),
+        )
+        for page_number, img in enumerate(images, start=first):
+            gray = np.array(img)  # копия с правом записи — normalize на месте
+            img.close()
+            yield page_number, page_count, gray
+
+
+def _iter_gray_pages(*, pdf: Path, last_page: int | None):
+    """Grayscale страницы (до предобработки): PyMuPDF, если доступен, иначе pdf2image."""
+    if FITZ_AVAILABLE:
+        return _render_gray_pages_fitz(pdf=pdf, last_page=last_page)
+    return _render_gray_pages_pdf2image(pdf=pdf, last_page=last_page)
+
+
+def iter_preprocessed_pages(
+    pdf_path: str | Path,
+    *,
+    workdir: Path,
+    max_pages: int | None = None,
+    in_memory: bool = False,
+) -> Iterator[PreprocessedPage]:
+    """Рендерит и предобрабатывает страницы PDF, отдавая их по одной по мере готовности.
+
+    Потребитель (OCR) может начинать работу с первыми страницами, пока
+    остальные ещё рендерятся. Файлы пишутся в `workdir` (rendered/ и
+    preprocessed/); удаление workdir — на стороне вызывающего.
 
     Args:
         pdf_path: путь к PDF
+        workdir: рабочая директория (см. `create_preprocess_workdir`)
         max_pages: ограничение по количеству страниц (None/<=0 = все)
+        in_memory: не писать файлы — отдать изображения в `PreprocessedPage.image`
 
-    Returns:
-        PreprocessedPDF с путями на (rendered_path, preprocessed_path) по каждой странице.
+    Yields:
+        PreprocessedPage в порядке документа.
     """
     pdf = _ensure_pdf_file(pdf_path)
     last_page = _normalize_max_pages(max_pages)
 
-    convert_from_path = _import_convert_from_path()
     cv2 = _import_cv2()
 
-    workdir, render_dir, preprocess_dir = _create_workdir()
-    started_at = time.perf_counter()
+    render_dir = workdir / "rendered"
+    preprocess_dir = workdir / "preprocessed"
+    render_dir.mkdir(parents=True, exist_ok=True)
+    preprocess_dir.mkdir(parents=True, exist_ok=True)
+    out_ext = _normalize_output_ext(str(PDF_PREPROCESS_OUTPUT_FORMAT))
 
     logger.info(
-        "PDF предпроцессинг: name=%s, size_bytes=%s, dpi=%s, fmt=%s, threads=%s, max_pages=%s",
+        "PDF предпроцессинг: name=%s, size_bytes=%s, dpi=%s, threads=%s, max_pages=%s, "
+        "renderer=%s, in_memory=%s",
         pdf.name,
         pdf.stat().st_size,
         PDF_RENDER_DPI,
-        PDF_RENDER_FORMAT,
         PDF_RENDER_THREAD_COUNT,
         last_page,
+        "fitz" if FITZ_AVAILABLE else "pdf2image",
+        in_memory,
     )
 
-    try:
-        image_paths = convert_from_path(
-            str(pdf),
-            dpi=int(PDF_RENDER_DPI),
-            first_page=1,
-            last_page=last_page,
-            output_folder=str(render_dir),
-            paths_only=True,
-            fmt=str(PDF_RENDER_FORMAT),
-            thread_count=int(PDF_RENDER_THREAD_COUNT),
-        )
+    # Рендер сразу в grayscale-массивы: в память или только preprocessed файлы
+    # (без промежуточных rendered файлов)
+    if in_memory or FITZ_AVAILABLE:
+        normalize = bool(PDF_PREPROCESS_NORMALIZE)
+        for page_number, page_count, gray in _iter_gray_pages(pdf=pdf, last_page=last_page):
+            gray, is_blank = _prepare_gray(cv2, gray, normalize=normalize)
+            if in_memory:
+                yield PreprocessedPage(
+                    page_number=page_number, page_count=page_count, image=gray, is_blank=is_blank
+                )
+            else:
+                preprocessed_path = _save_preprocessed(
+                    cv2=cv2,
+                    gray=gray,
+                    preprocess_dir=preprocess_dir,
+                    page_number=page_number,
+                    output_ext=out_ext,
+                )
+                yield PreprocessedPage(
+                    page_number=page_number,
+                    page_count=page_count,
+                    preprocessed_path=preprocessed_path,
+                    is_blank=is_blank,
+                )
+        return
 
-        logger.info("PDF рендер завершён: pages=%s, rendered_dir=%s", len(image_paths), render_dir)
+    # Промежуточный рендер — несжатый grayscale PGM: файл сразу перечитывается
+    # cv2, поэтому PNG/JPEG кодирование (и потери JPEG) здесь только тратят CPU
+    convert_from_path = _import_convert_from_path()
+    image_paths = convert_from_path(
+        str(pdf),
+        dpi=int(PDF_RENDER_DPI),
+        first_page=1,
+        last_page=last_page,
+        output_folder=str(render_dir),
+        output_file="page",
+        paths_only=True,
+        fmt="ppm",
+        grayscale=True,
+        thread_count=int(PDF_RENDER_THREAD_COUNT),
+    )
 
-        out_ext = _normalize_output_ext(str(PDF_PREPROCESS_OUTPUT_FORMAT))
-        pages: list[PreprocessedPage] = []
-        total_pages = len(image_paths)
+    logger.info("PDF рендер завершён: pages=%s, rendered_dir=%s", len(image_paths), render_dir)
 
-        for page_number, img_path in enumerate(image_paths, start=1):
-            rendered_path = Path(img_path)
-            logger.info("Предобработка страницы %s/%s: %s", page_number, total_pages, rendered_path.name)
+    total_pages = len(image_paths)
+    debug = logger.isEnabledFor(logging.DEBUG)
 
-            preprocessed_path = _preprocess_page_to_file(
-                cv2=cv2,
-                rendered_path=rendered_path,
-                preprocess_dir=preprocess_dir,
-                page_number=page_number,
-                normalize=bool(PDF_PREPROCESS_NORMALIZE),
-                output_ext=out_ext,
-            )
+    for page_number, img_path in enumerate(image_paths, start=1):
+        rendered_path = Path(img_path)
+        if debug:
+            logger.debug("Предобработка страницы %s/%s: %s", page_number, total_pages, rendered_path.name)
 
-            pages.append(
-                PreprocessedPage(
-                    page_number=page_number,
-                    rendered_path=rendered_path,
-                    preprocessed_path=preprocessed_path,
-                )
-            )
+        preprocessed_path, is_blank = _preprocess_page_to_file(
+            cv2=cv2,
+            rendered_path=rendered_path,
+            preprocess_dir=preprocess_dir,
+            page_number=page_number,
+            normalize=bool(PDF_PREPROCESS_NORMALIZE),
+            output_ext=out_ext,
+        )
 
-        duration = time.perf_counter() - started_at
-        logger.info(
-            "PDF предпроцессинг завершён: pages=%s, preprocessed_dir=%s, workdir=%s, seconds=%.2f",
-            len(pages),
-            preprocess_dir,
-            workdir,
-            duration,
+        yield PreprocessedPage(
+            page_number=page_number,
+            page_count=total_pages,
+            rendered_path=rendered_path,
+            preprocessed_path=preprocessed_path,
+            is_blank=is_blank,
         )
 
-        return PreprocessedPDF(pdf_path=pdf, workdir=workdir, pages=pages)
+
+def preprocess_pdf_to_images(
+    pdf_path: str | Path, *, max_pages: int | None = None, in_memory: bool = False
+) -> PreprocessedPDF:
+    """Рендерит PDF в изображения и делает простую предобработку (grayscale + normalize).
+
+    Важно:
+    - Настройки берутся ТОЛЬКО из `config.py`.
+    - `max_pages` — runtime-ограничение для тестов (не "настройка качества").
+
+    Args:
+        pdf_path: путь к PDF
+        max_pages: ограничение по количеству страниц (None/<=0 = все)
+        in_memory: не писать файлы — отдать изображения в `PreprocessedPage.image`
+
+    Returns:
+        PreprocessedPDF с путями на (rendered_path, preprocessed_path) по каждой странице
+        (или с изображениями в памяти при `in_memory=True`).
+    """
+    pdf = _ensure_pdf_file(pdf_path)
+    workdir = create_preprocess_workdir()
+    started_at = time.perf_counter()
+
+    try:
+        pages = list(
+            iter_preprocessed_pages(pdf, workdir=workdir, max_pages=max_pages, in_memory=in_memory)
+        )
     except Exception:
         logger.exception("Ошибка предпроцессинга PDF: %s", pdf)
         shutil.rmtree(workdir, ignore_errors=True)
         raise
+
+    logger.info(
+        "PDF предпроцессинг завершён: pages=%s, in_memory=%s, workdir=%s, seconds=%.2f",
+        len(pages),
+        in_memory,
+        workdir,
+        time.perf_counter() - started_at,
+    )
+    return PreprocessedPDF(pdf_path=pdf, workdir=workdir, pages=pages)
@@ -18,12 +18,15 @@ from __future__ import annotations
 
 import asyncio
 import os
+import re
 import time
+from contextlib import AsyncExitStack
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
+import aiofiles
 import aiohttp
 
 from config import logger
@@ -35,6 +38,10 @@ from services.defect_extractor import extract_defects, save_extraction_result, D
 from services.defect_deduplicator import deduplicate_defects, save_dedup_result, DeduplicationResult
 from services.excel_generator import generate_excel_report
 
+# Скачанный PDF пишется на диск блоками ~1 МБ: каждая запись уходит в поток,
+# и передача в пул дороже записи одного сетевого чанка (64 КБ) в page cache
+_DOWNLOAD_WRITE_BUFFER_BYTES = 1024 * 1024
+
 
 # =============================================================================
 # Ошибки пайплайна
@@ -164,9 +171,18 @@ class PipelineResult:
 # =============================================================================
 
 
+# Ссылка на файл Google Drive (/file/d/<id> или ?id=<id>) — для фильтра бота
+# F.text.regexp: отсекает сообщения без ссылки до вызова хендлера.
+# ID извлекается extract_google_drive_file_id.
+GDRIVE_LINK_RE = re.compile(
+    r"\s*https?://drive\.google\.[^/\s]+/(?:file/d/[^/\s?#]+|\S*[?&]id=[^&\s#]+)"
+)
+
+
 def extract_google_drive_file_id(url: str) -> str | None:
     """Извлекает идентификатор файла из ссылки Google Drive."""
-    if not url:
+    # Быстрый отсев текстов без домена Google Drive до разбора URL
+    if not url or "drive.google." not in url:
         return None
 
     parsed = urlparse(url.strip())
@@ -220,14 +236,22 @@ def format_size(size_bytes: int) -> str:
 class DefectAnalysisPipeline:
     """Оркестратор шагов анализа дефектов."""
 
-    def __init__(self, source_url: str, pipeline_dir: Path | None = None):
+    def __init__(
+        self,
+        source_url: str,
+        pipeline_dir: Path | None = None,
+        http_session: aiohttp.ClientSession | None = None,
+    ):
         """
         Args:
             source_url: Ссылка на PDF в Google Drive
             pipeline_dir: Папка для артефактов (если None — создаётся автоматически)
+            http_session: Общая aiohttp-сессия с пулом соединений (если None —
+                на скачивание создаётся временная сессия)
         """
         self.source_url = source_url.strip()
         self.pipeline_dir = pipeline_dir or self._create_pipeline_dir()
+        self._http_session = http_session
         self.started_at = time.perf_counter()
 
         # Внутренние данные для передачи между шагами
@@ -281,7 +305,9 @@ class DefectAnalysisPipeline:
         direct_url = build_direct_download_url(file_id)
         start = time.perf_counter()
 
-        async with aiohttp.ClientSession() as session:
+        async with AsyncExitStack() as stack:
+            # Общая сессия переиспользует TCP/TLS соединения между пайплайнами
+            session = self._http_session or await stack.enter_async_context(aiohttp.ClientSession())
             async with session.get(direct_url) as response:
                 if response.status != 200:
                     raise PipelineError(f"Ошибка загрузки: HTTP {response.status}")
@@ -314,14 +340,20 @@ class DefectAnalysisPipeline:
                 if not first_chunk.startswith(b"%PDF-"):
                     raise PipelineError("Скачанный файл не является PDF.")
 
-                # Сохраняем файл
-                with open(local_path, "wb") as f:
-                    f.write(first_chunk)
+                # Сохраняем файл через aiofiles (запись в потоке, event loop бота не блокируется);
+                # сетевые чанки копятся в буфер и пишутся блоками
+                async with aiofiles.open(local_path, "wb") as f:
+                    buffer = bytearray(first_chunk)
                     async for chunk in response.content.iter_chunked(65536):
-                        f.write(chunk)
+                        buffer += chunk
+                        if len(buffer) >= _DOWNLOAD_WRITE_BUFFER_BYTES:
+                            await f.write(buffer)
+                            buffer.clear()
+                    if buffer:
+                        await f.write(buffer)
 
         duration = time.perf_counter() - start
-        size_bytes = os.path.getsize(local_path)
+        size_bytes = await asyncio.to_thread(os.path.getsize, local_path)
 
         self._file_id = file_id
         self._pdf_path = local_path
@@ -463,10 +495,7 @@ class DefectAnalysisPipeline:
 
         start = time.perf_counter()
 
-        # filter_relevant_pages — синхронная функция
-        result = await asyncio.to_thread(
-            filter_relevant_pages, self._ocr_meta.txt_path
-        )
+        result = await filter_relevant_pages(self._ocr_meta.txt_path)
 
         duration = time.perf_counter() - start
 
@@ -285,6 +285,12 @@ PII_PATTERNS: list[PIIPattern] = [
     ),
 ]
 
+# Скомпилированные паттерны — один раз на модуль, а не на каждую страницу
+_COMPILED_PII_PATTERNS: list[tuple[PIIPattern, re.Pattern[str]]] = [
+    (pii_pattern, re.compile(pii_pattern.pattern, re.IGNORECASE))
+    for pii_pattern in PII_PATTERNS
+]
+
 
 # =============================================================================
 # Результаты маскирования
@@ -418,12 +424,11 @@ def mask_pii_in_text(text: str, page_number: int = 0) -> PageMaskingResult:
     # Шаг 1: Маскируем ФИО с помощью NER + NamesExtractor
     masked_text = _mask_names_with_ner(text, matches)
 
-    # Шаг 2: Маскируем остальные PII с помощью regex
-    for pii_pattern in PII_PATTERNS:
-        regex = re.compile(pii_pattern.pattern, re.IGNORECASE)
+    # Шаг 2: Маскируем остальные PII с помощью regex.
+    # Поиск для отчётности и замена — за один проход sub() с callback
+    for pii_pattern, regex in _COMPILED_PII_PATTERNS:
 
-        # Находим все совпадения для отчётности
-        for match in regex.finditer(masked_text):
+        def replace(match: re.Match[str], pii_pattern: PIIPattern = pii_pattern) -> str:
             # Проверяем что это не уже замаскированный плейсхолдер
             if not match.group().startswith("["):
                 matches.append(PIIMatch(
@@ -431,9 +436,9 @@ def mask_pii_in_text(text: str, page_number: int = 0) -> PageMaskingResult:
                     original=match.group(),
                     position=match.start(),
                 ))
+            return pii_pattern.placeholder
 
-        # Заменяем все совпадения
-        masked_text = regex.sub(pii_pattern.placeholder, masked_text)
+        masked_text = regex.sub(replace, masked_text)
 
     return PageMaskingResult(
         page_number=page_number,
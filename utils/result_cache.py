@@ -0,0 +1,134 @@
+"""Дисковый кэш результатов пайплайна.
+
+Один и тот же документ Google Drive часто присылают несколько пользователей
+(общая ссылка в рабочем чате). Кэш хранит готовый Excel отчёт и метаданные
+для подписи по ключу (ID файла), чтобы повторный запрос не запускал
+все 7 шагов пайплайна заново.
+
+Формат хранения в `cache_dir`:
+    <key>.xlsx — Excel отчёт
+    <key>.json — метаданные; пишется последним и служит признаком целой записи
+
+Вытеснение: по TTL (возраст записи, `cached_at` в json) и по количеству
+записей (самые давно использованные — по mtime json, обновляется при чтении).
+Функции синхронные (файловый I/O) — из async кода вызываются
+через `asyncio.to_thread`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from config import logger
+
+
+@dataclass
+class CachedResult:
+    """Запись кэша результатов."""
+
+    excel_path: Path
+    meta: dict[str, Any]
+
+
+def _entry_paths(cache_dir: Path, key: str) -> tuple[Path, Path]:
+    """Возвращает пути (excel, json) записи кэша для ключа."""
+    safe_key = "".join(ch for ch in key if ch.isalnum() or ch in {"_", "-"})
+    return cache_dir / f"{safe_key}.xlsx", cache_dir / f"{safe_key}.json"
+
+
+def load_cached_result(cache_dir: Path, key: str, ttl_seconds: float) -> CachedResult | None:
+    """Ищет свежую запись кэша.
+
+    Args:
+        cache_dir: Директория кэша
+        key: Ключ записи (ID файла Google Drive)
+        ttl_seconds: Максимальный возраст записи
+
+    Returns:
+        CachedResult или None, если записи нет, она устарела или повреждена
+    """
+    excel_path, meta_path = _entry_paths(cache_dir, key)
+    try:
+        entry = json.loads(meta_path.read_text(encoding="utf-8"))
+        if time.time() - entry["cached_at"] > ttl_seconds or not excel_path.exists():
+            return None
+        # Отмечаем использование (mtime) для вытеснения давно не используемых записей
+        os.utime(meta_path)
+    except (OSError, KeyError, TypeError, json.JSONDecodeError):
+        return None
+
+    return CachedResult(excel_path=excel_path, meta=entry["meta"])
+
+
+def store_result(
+    cache_dir: Path,
+    key: str,
+    excel_path: Path,
+    meta: dict[str, Any],
+    max_entries: int,
+) -> None:
+    """Сохраняет результат в кэш (атомарно) и вытесняет лишние записи.
+
+    Args:
+        cache_dir: Директория кэша
+        key: Ключ записи (ID файла Google Drive)
+        excel_path: Путь к готовому Excel отчёту
+        meta: Метаданные для подписи к отчёту (JSON-сериализуемые)
+        max_entries: Максимальное количество записей в кэше
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cached_excel, meta_path = _entry_paths(cache_dir, key)
+
+    # Пишем во временные файлы и подменяем через os.replace: параллельный
+    # читатель видит либо старую, либо новую запись целиком. Имена временных
+    # файлов уникальны (mkstemp): два пайплайна по одной ссылке, завершившиеся
+    # одновременно в потоках одного процесса, не пишут в один и тот же файл
+    entry = {"cached_at": time.time(), "meta": meta}
+    tmp_paths: list[str] = []
+    try:
+        fd, tmp_excel = tempfile.mkstemp(dir=cache_dir, prefix=f"{key}.", suffix=".xlsx.tmp")
+        tmp_paths.append(tmp_excel)
+        with os.fdopen(fd, "wb") as dst, excel_path.open("rb") as src:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_excel, cached_excel)
+
+        fd, tmp_meta = tempfile.mkstemp(dir=cache_dir, prefix=f"{key}.", suffix=".json.tmp")
+        tmp_paths.append(tmp_meta)
+        with os.fdopen(fd, "w", encoding="utf-8") as dst:
+            dst.write(json.dumps(entry, ensure_ascii=False))
+        os.replace(tmp_meta, meta_path)
+    except BaseException:
+        for tmp_path in tmp_paths:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+        raise
+
+    _evict(cache_dir, max_entries)
+
+
+def _evict(cache_dir: Path, max_entries: int) -> None:
+    """Удаляет самые давно использованные записи сверх лимита."""
+    entries = []
+    for meta_path in cache_dir.glob("*.json"):
+        try:
+            entries.append((meta_path.stat().st_mtime, meta_path))
+        except FileNotFoundError:
+            continue  # запись уже удалена параллельным вытеснением
+
+    entries.sort(reverse=True)
+    for _, meta_path in entries[max_entries:]:
+        for path in (meta_path, meta_path.with_suffix(".xlsx")):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        logger.debug("Кэш результатов: вытеснена запись %s", meta_path.stem)